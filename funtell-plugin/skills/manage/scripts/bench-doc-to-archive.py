@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Bench-Doc-to-Archive: Time doc-to-archive.py on synthetic PDF and DOCX documents.
+
+Generates documents of configurable size, then runs them through
+write_archive, the streaming path the CLI takes, and times each of its stages
+(process_pdf / process_docx, build_structure, finish_archive) as --profile
+reports them. Records peak memory per stage and writes machine-readable JSON
+so runs can be compared over time or between the serial and parallel paths.
+
+Usage:
+    python scripts/bench-doc-to-archive.py [options]
+
+Options:
+    --pages, -p         Comma-separated page counts (default: 20,100)
+    --images, -i        Images per page (default: 2)
+    --image-size        Image side length in px (default: 256)
+    --heading-density   Fraction of paragraphs that are headings (default: 0.3)
+    --paragraphs        Paragraphs per page (default: 12)
+    --formats           Comma-separated formats: pdf,docx (default: pdf,docx)
+    --workers, -w       Comma-separated PDF worker counts to compare (default: 1,4)
+    --repeat, -r        Timed runs per configuration, best kept (default: 3)
+    --output, -o        Results JSON path (default: bench-results.json)
+    --keep              Keep generated documents in this directory
+
+Requirements:
+    pip install -r scripts/requirements-doc.txt
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+
+
+# ── Loading the converter ────────────────────────────────────────────
+
+def load_converter():
+    """Import doc-to-archive.py through its doc_to_archive shim (next to this script)."""
+    import doc_to_archive
+    return doc_to_archive
+
+
+# ── Synthetic documents ──────────────────────────────────────────────
+
+def _paragraph_kinds(rng: random.Random, count: int, heading_density: float) -> list[str]:
+    """Pick category / item / body for each paragraph slot."""
+    kinds = []
+    for _ in range(count):
+        if rng.random() < heading_density:
+            kinds.append("category" if rng.random() < 0.25 else "item")
+        else:
+            kinds.append("body")
+    return kinds
+
+
+def _noise_png(fitz, rng: random.Random, size: int) -> bytes:
+    """A random-noise PNG: incompressible and unique, like real photos."""
+    samples = rng.randbytes(size * size * 3)
+    pix = fitz.Pixmap(fitz.csRGB, size, size, samples, False)
+    return pix.tobytes("png")
+
+
+def make_pdf(path: str, pages: int, images: int, image_size: int,
+             heading_density: float, paragraphs: int, seed: int = 0) -> None:
+    """Write a synthetic PDF with headings, body text and images on every page."""
+    import pymupdf as fitz
+    rng = random.Random(seed)
+    doc = fitz.open()
+    counter = 0
+    for page_num in range(pages):
+        page = doc.new_page()
+        y = 50
+        for kind in _paragraph_kinds(rng, paragraphs, heading_density):
+            counter += 1
+            if kind == "category":
+                page.insert_text((50, y), f"Category {counter}", fontsize=20)
+                y += 30
+            elif kind == "item":
+                page.insert_text((50, y), f"Item {counter}", fontsize=12, fontname="hebo")
+                y += 18
+            else:
+                for _ in range(3):
+                    page.insert_text((50, y), f"Body text {counter} " + "lorem ipsum " * 6, fontsize=10)
+                    y += 13
+                y += 5
+        for i in range(images):
+            top = 60 + i * (700 // max(images, 1))
+            rect = fitz.Rect(380, top, 380 + 150, top + 150)
+            page.insert_image(rect, stream=_noise_png(fitz, rng, image_size))
+    doc.save(path)
+    doc.close()
+
+
+def make_docx(path: str, pages: int, images: int, image_size: int,
+              heading_density: float, paragraphs: int, seed: int = 0) -> None:
+    """Write a synthetic DOCX with the same content as make_pdf (one page = paragraphs paragraphs)."""
+    import io
+    import docx
+    import pymupdf as fitz
+    rng = random.Random(seed)
+    doc = docx.Document()
+    counter = 0
+    for _ in range(pages):
+        for kind in _paragraph_kinds(rng, paragraphs, heading_density):
+            counter += 1
+            if kind == "category":
+                doc.add_heading(f"Category {counter}", level=1)
+            elif kind == "item":
+                doc.add_paragraph().add_run(f"Item {counter}").bold = True
+            else:
+                doc.add_paragraph(f"Body text {counter} " + "lorem ipsum " * 18)
+        for _ in range(images):
+            doc.add_picture(io.BytesIO(_noise_png(fitz, rng, image_size)))
+    doc.save(path)
+
+
+GENERATORS = {"pdf": make_pdf, "docx": make_docx}
+
+
+# ── Timing ───────────────────────────────────────────────────────────
+
+def run_stages(d2a, fmt: str, path: str, workers: int, out_path: str, trace: bool) -> dict:
+    """Convert path once through write_archive; return its per-stage results."""
+    args = d2a.build_parser().parse_args(["--no-cache", "--workers", str(workers)])
+    profiler = d2a.Profiler()
+    if trace:
+        tracemalloc.start()
+    try:
+        project, _, _ = d2a.write_archive(path, fmt, out_path, args, path, profiler)
+    finally:
+        if trace:
+            tracemalloc.stop()
+
+    stages = {}
+    for name in (f"process_{fmt}", "build_structure", "finish_archive"):
+        stages[name] = {"seconds": profiler.stages[name]}
+        if trace:
+            stages[name]["peak_bytes"] = profiler.memory_peaks[name]
+    return {
+        "stages": stages,
+        "blocks": profiler.counters.get("text_blocks", 0),
+        "images": profiler.counters.get("images_found", 0),
+        "archive_images": profiler.counters.get("images_written", 0),
+        "content_items": len(project["contentItems"]),
+        "archive_bytes": os.path.getsize(out_path),
+    }
+
+
+def benchmark(d2a, fmt: str, path: str, workers: int, repeat: int, work_dir: str) -> dict:
+    """Best-of-repeat stage timings plus one traced run for peak memory."""
+    out_path = os.path.join(work_dir, "out.zip")
+    best = None
+    for _ in range(repeat):
+        run = run_stages(d2a, fmt, path, workers, out_path, trace=False)
+        if best is None:
+            best = run
+        else:
+            for name, timing in run["stages"].items():
+                best["stages"][name]["seconds"] = min(best["stages"][name]["seconds"], timing["seconds"])
+    traced = run_stages(d2a, fmt, path, workers, out_path, trace=True)
+    for name, timing in traced["stages"].items():
+        best["stages"][name]["peak_bytes"] = timing["peak_bytes"]
+    best["total_seconds"] = sum(t["seconds"] for t in best["stages"].values())
+    return best
+
+
+# ── CLI ──────────────────────────────────────────────────────────────
+
+def _int_list(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark doc-to-archive.py on synthetic documents.")
+    parser.add_argument("-p", "--pages", type=_int_list, default=[20, 100],
+                        help="Comma-separated page counts (default: 20,100)")
+    parser.add_argument("-i", "--images", type=int, default=2, help="Images per page (default: 2)")
+    parser.add_argument("--image-size", type=int, default=256, help="Image side length in px (default: 256)")
+    parser.add_argument("--heading-density", type=float, default=0.3,
+                        help="Fraction of paragraphs that are headings (default: 0.3)")
+    parser.add_argument("--paragraphs", type=int, default=12, help="Paragraphs per page (default: 12)")
+    parser.add_argument("--formats", default="pdf,docx", help="Comma-separated formats (default: pdf,docx)")
+    parser.add_argument("-w", "--workers", type=_int_list, default=[1, 4],
+                        help="Comma-separated PDF worker counts to compare (default: 1,4)")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="Timed runs per configuration, best kept (default: 3)")
+    parser.add_argument("-o", "--output", default="bench-results.json",
+                        help="Results JSON path (default: bench-results.json)")
+    parser.add_argument("--keep", help="Keep generated documents in this directory")
+    args = parser.parse_args()
+
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    for fmt in formats:
+        if fmt not in GENERATORS:
+            print(f"Error: Unknown format '{fmt}'. Supported: {', '.join(GENERATORS)}")
+            sys.exit(1)
+
+    d2a = load_converter()
+
+    import pymupdf
+    results = {
+        "generatedAt": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pymupdf": pymupdf.VersionBind,
+        "cpu_count": os.cpu_count(),
+        "runs": [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix="d2a_bench_") as work_dir:
+        doc_dir = args.keep or work_dir
+        os.makedirs(doc_dir, exist_ok=True)
+        for fmt in formats:
+            for pages in args.pages:
+                path = os.path.join(doc_dir, f"synthetic-{pages}p-{args.images}i.{fmt}")
+                print(f"Generating {path}...")
+                GENERATORS[fmt](path, pages, args.images, args.image_size,
+                                args.heading_density, args.paragraphs)
+                # Worker count only affects PDF extraction
+                for workers in (args.workers if fmt == "pdf" else [1]):
+                    run = benchmark(d2a, fmt, path, workers, args.repeat, work_dir)
+                    run.update({
+                        "format": fmt, "pages": pages, "images_per_page": args.images,
+                        "image_size": args.image_size, "heading_density": args.heading_density,
+                        "paragraphs_per_page": args.paragraphs, "workers": workers,
+                        "file_bytes": os.path.getsize(path),
+                    })
+                    results["runs"].append(run)
+                    timings = ", ".join(f"{name} {t['seconds']:.3f}s" for name, t in run["stages"].items())
+                    print(f"  {fmt} {pages}p workers={workers}: {timings}")
+
+    # ru_maxrss is KB on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    results["max_rss_bytes"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    results["max_rss_children_bytes"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
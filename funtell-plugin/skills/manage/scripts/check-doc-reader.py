@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Check-Doc-Reader: Compare doc-to-archive.py's built-in .doc reader with the LibreOffice path.
+
+Converts every .doc in doc-fixtures/ twice: with the built-in Word 97-2003
+reader, and through LibreOffice to .docx (the fallback path). Both must give
+the same card description, categories, items, text and image bytes. Without
+LibreOffice the built-in reader's output is compared with
+doc-fixtures/expected.json instead, which --update rewrites. A file the
+built-in reader refuses (such as encrypted.doc) must be refused with the
+expected reason.
+
+With --generate (needs LibreOffice), documents with headings, bold items,
+field codes, inline JPEG and PNG pictures and a table are also written with
+python-docx, saved as .doc by LibreOffice and compared the same way.
+
+Usage:
+    python scripts/check-doc-reader.py [options]
+
+Options:
+    --fixtures DIR   Directory of .doc files to check (default: doc-fixtures)
+    --generate       Also build documents through LibreOffice and check them
+    --keep DIR       Keep generated documents in this directory
+    --update         Rewrite expected.json from the built-in reader's output
+
+Exits with status 1 if any document differs.
+
+Requirements:
+    pip install -r scripts/requirements-doc.txt
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Differences printed per document
+MAX_DIFF_LINES = 10
+
+
+def load_converter():
+    """Import doc-to-archive.py through its doc_to_archive shim (next to this script)."""
+    import doc_to_archive
+    return doc_to_archive
+
+
+# ── Conversion ───────────────────────────────────────────────────────
+
+def convert_project(d2a, source: str | bytes, kind: str, name_path: str) -> dict:
+    """
+    Convert source and reduce the archive to what is compared: the card
+    description and each content item's name, content, parent and image digest.
+    """
+    args = d2a.build_parser().parse_args(["--no-cache"])
+    buf = io.BytesIO()
+    project, _, _ = d2a.write_archive(source, kind, buf, args, name_path, in_memory=True)
+    with zipfile.ZipFile(buf) as zf:
+        items = [
+            [ci["name"], ci["content"], ci["parent_name"],
+             hashlib.sha256(zf.read(ci["image"])).hexdigest() if ci["image"] else None]
+            for ci in project["contentItems"]
+        ]
+    return {"description": project["card"]["description"], "contentItems": items}
+
+
+def builtin_result(d2a, path: str) -> dict:
+    """The built-in reader's project for path, or {"unsupported": reason} if it refuses the file."""
+    try:
+        return convert_project(d2a, path, "doc", path)
+    except d2a.UnsupportedDocError as e:
+        return {"unsupported": str(e)}
+
+
+def libreoffice_result(d2a, path: str) -> dict:
+    """The project for path converted through LibreOffice and the .docx reader."""
+    return convert_project(d2a, d2a._doc_to_docx_bytes(path), "docx", path)
+
+
+def diff(expected: dict, actual: dict) -> list[str]:
+    """Human-readable differences between two results (empty if they match)."""
+    if expected == actual:
+        return []
+    if "unsupported" in expected or "unsupported" in actual:
+        return [f"expected {expected.get('unsupported', 'a conversion')!r}, "
+                f"got {actual.get('unsupported', 'a conversion')!r}"]
+    lines = []
+    if expected["description"] != actual["description"]:
+        lines.append(f"description: {expected['description']!r} != {actual['description']!r}")
+    want, got = expected["contentItems"], actual["contentItems"]
+    for i in range(max(len(want), len(got))):
+        a = want[i] if i < len(want) else None
+        b = got[i] if i < len(got) else None
+        if a != b:
+            lines.append(f"item {i}: {a!r} != {b!r}")
+    return lines
+
+
+# ── Generated documents ──────────────────────────────────────────────
+
+def _noise_image(fmt: str, seed: int, size: int = 96) -> bytes:
+    """A random-noise picture in fmt ("png" or "jpg")."""
+    import pymupdf
+    samples = random.Random(seed).randbytes(size * size * 3)
+    return pymupdf.Pixmap(pymupdf.csRGB, size, size, samples, False).tobytes(fmt)
+
+
+def _add_field(paragraph, instruction: str, result: str) -> None:
+    """Append a complex field (begin, instruction, separate, result, end) to paragraph."""
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+
+    def char(kind):
+        run = paragraph.add_run()
+        fld = OxmlElement("w:fldChar")
+        fld.set(qn("w:fldCharType"), kind)
+        run._r.append(fld)
+
+    char("begin")
+    instr = OxmlElement("w:instrText")
+    instr.set(qn("xml:space"), "preserve")
+    instr.text = f" {instruction} "
+    paragraph.add_run()._r.append(instr)
+    char("separate")
+    paragraph.add_run(result)
+    char("end")
+
+
+def make_documents(out_dir: str) -> list[str]:
+    """Write the generated test documents as .docx; returns their paths."""
+    import docx
+    from docx.shared import Inches
+
+    paths = []
+
+    doc = docx.Document()
+    doc.add_heading("Opening Hours", level=1)
+    doc.add_paragraph().add_run("Weekdays").bold = True
+    doc.add_paragraph("Open from nine to five, closed on public holidays.")
+    doc.add_heading("Guided tours", level=2)
+    field = doc.add_paragraph("Tours start at ")
+    _add_field(field, 'QUOTE "10:30"', "10:30")
+    field.add_run(" and last an hour.")
+    doc.add_heading("Café", level=1)
+    doc.add_paragraph("Ünïcödé text, “smart quotes” and an em dash — all kept.")
+    paths.append(os.path.join(out_dir, "headings-fields.docx"))
+    doc.save(paths[-1])
+
+    doc = docx.Document()
+    doc.add_heading("Collection", level=1)
+    for n, fmt in enumerate(("jpg", "png")):
+        doc.add_heading(f"Exhibit {n + 1}", level=2)
+        doc.add_paragraph().add_run().add_picture(io.BytesIO(_noise_image(fmt, n)), width=Inches(1))
+        doc.add_paragraph(f"The inline {fmt.upper()} picture above belongs to this exhibit.")
+    paths.append(os.path.join(out_dir, "pictures.docx"))
+    doc.save(paths[-1])
+
+    doc = docx.Document()
+    doc.add_heading("Prices", level=1)
+    doc.add_paragraph("The table below is skipped, as the .docx reader skips tables.")
+    table = doc.add_table(rows=2, cols=2)
+    for r, row in enumerate((("Adults", "12"), ("Children", "6"))):
+        for c, text in enumerate(row):
+            table.cell(r, c).text = text
+    doc.add_paragraph("Text after the table.")
+    paths.append(os.path.join(out_dir, "table.docx"))
+    doc.save(paths[-1])
+    return paths
+
+
+def save_as_doc(libreoffice: str, docx_paths: list[str], out_dir: str) -> list[str]:
+    """Have LibreOffice save docx_paths as Word 97-2003 .doc files in out_dir."""
+    subprocess.run(
+        [libreoffice, "--headless", "--convert-to", "doc:MS Word 97", "--outdir", out_dir, *docx_paths],
+        capture_output=True, text=True, timeout=120, check=True,
+    )
+    return [os.path.join(out_dir, os.path.splitext(os.path.basename(p))[0] + ".doc") for p in docx_paths]
+
+
+# ── CLI ──────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the built-in .doc reader with the LibreOffice path.")
+    parser.add_argument("--fixtures", default=os.path.join(SCRIPT_DIR, "doc-fixtures"),
+                        help="Directory of .doc files to check (default: doc-fixtures)")
+    parser.add_argument("--generate", action="store_true",
+                        help="Also build documents through LibreOffice and check them")
+    parser.add_argument("--keep", help="Keep generated documents in this directory")
+    parser.add_argument("--update", action="store_true",
+                        help="Rewrite expected.json from the built-in reader's output")
+    args = parser.parse_args()
+
+    d2a = load_converter()
+    libreoffice = d2a._find_libreoffice()
+    if args.generate and not libreoffice:
+        print("Error: --generate needs LibreOffice. Install from https://www.libreoffice.org/download")
+        sys.exit(1)
+
+    expected_path = os.path.join(args.fixtures, "expected.json")
+    expected = {}
+    if os.path.isfile(expected_path):
+        with open(expected_path, encoding="utf-8") as f:
+            expected = json.load(f)
+
+    failures = 0
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="d2a_doccheck_") as work_dir:
+        fixtures = sorted(
+            os.path.join(args.fixtures, name) for name in os.listdir(args.fixtures) if name.endswith(".doc")
+        )
+        generated = []
+        if args.generate:
+            out_dir = args.keep or work_dir
+            os.makedirs(out_dir, exist_ok=True)
+            generated = save_as_doc(libreoffice, make_documents(out_dir), out_dir)
+
+        for path in fixtures + generated:
+            name = os.path.basename(path)
+            result = builtin_result(d2a, path)
+            if path in generated:
+                # Plain LibreOffice output must never need the fallback
+                reference, against = libreoffice_result(d2a, path), "LibreOffice"
+            else:
+                results[name] = result
+                if libreoffice and "unsupported" not in result:
+                    reference, against = libreoffice_result(d2a, path), "LibreOffice"
+                elif name in expected and not args.update:
+                    reference, against = expected[name], "expected.json"
+                else:
+                    print(f"  {name}: {'recorded' if args.update else 'no reference (not in expected.json)'}")
+                    continue
+            problems = diff(reference, result)
+            print(f"  {name}: {'differs from' if problems else 'matches'} {against}")
+            for line in problems[:MAX_DIFF_LINES]:
+                print(f"      {line}")
+            if len(problems) > MAX_DIFF_LINES:
+                print(f"      ... and {len(problems) - MAX_DIFF_LINES} more")
+            failures += bool(problems)
+
+    if args.update:
+        with open(expected_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\nExpected results written: {expected_path}")
+    if failures:
+        print(f"\n{failures} document(s) differ")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
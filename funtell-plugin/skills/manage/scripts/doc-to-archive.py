@@ -7,34 +7,101 @@ Usage:
     python scripts/doc-to-archive.py input.pdf [options]
     python scripts/doc-to-archive.py input.docx [options]
     python scripts/doc-to-archive.py input.doc [options]
+    python scripts/doc-to-archive.py a.pdf b.doc folder/ [options]   (batch mode)
+    python scripts/doc-to-archive.py --serve 8765 [options]            (service mode)
 
 Options:
-    --output, -o    Output ZIP path (default: {input_name}_archive.zip)
+    --output, -o    Output ZIP path (default: {input_name}_archive.zip);
+                    output directory in batch mode
     --name, -n      Project name (default: filename without extension)
     --language, -l  Original language code (default: en)
     --mode, -m      Content mode: single|list|grid|cards (default: list)
     --grouped, -g   Enable grouped categories (default: auto-detect)
+    --workers, -w   Worker processes for PDF extraction and image normalization,
+                    or files / LibreOffice instances in batch mode (default: 1)
+    --normalize-images  Downscale/re-encode images (see --max-dimension, --image-format,
+                    --image-quality, --thumbnail-size; requires Pillow)
+    --zip-level     Deflate level 0-9 for project.json (default: 6; images that are
+                    already compressed are stored as-is)
+    --compact-json  Write project.json without indentation
+    --max-archive-size  Split the output into independent archives of whole
+                    categories, at most MB each (--split-by-category: one each)
+    --pages         Only convert these PDF pages, e.g. 10-120,300- (1-based)
+    --sample-pages  Detect PDF headings from N sampled pages (default: all pages)
+    --page-timeout  Extract each PDF page in an isolated worker with a time budget;
+                    pages over budget are retried text-only, then skipped and
+                    reported (--page-memory MB adds a memory budget on Linux)
+    --fast-text     Read PDF font size/bold from the ends of each line instead of
+                    every span (faster on span-heavy pages)
+    --libreoffice   Convert .doc files with LibreOffice instead of the built-in reader
+    --no-cache      Skip the extraction cache (see --cache-dir, --cache-size)
+    --serve         Run as a local conversion service on 127.0.0.1:PORT or a Unix
+                    socket path (see --max-queue, --job-timeout); POST /convert, GET /metrics
+    --profile       Print a JSON timing/memory report (--stats-json PATH writes it
+                    to a file; --cprofile PATH dumps cProfile stats)
+
+Library use (doc_to_archive.py is an importable name for this script):
+    from doc_to_archive import convert, ConversionError
+    archive_bytes = convert(upload_bytes, "catalogue.pdf", mode="cards")
+    convert(file_obj, "notes.docx", output=stream)   # write to a binary stream
 
 Requirements:
     pip install -r scripts/requirements-doc.txt
-    LibreOffice (for .doc support): https://www.libreoffice.org/download
+    LibreOffice (optional, for .doc files the built-in reader can't handle):
+        https://www.libreoffice.org/download
 """
 
 import argparse
+import bisect
+import contextlib
+import cProfile
+import functools
+import hashlib
+import importlib
+import io
 import json
+import logging
 import os
+import posixpath
+import random
 import re
 import shutil
+import signal
+import socketserver
+import struct
 import subprocess
 import sys
 import tempfile
+import threading
+import time
+import tracemalloc
 import zipfile
-from collections import Counter
+from collections import Counter, deque
+from collections.abc import Callable, Sequence
 from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple
+from urllib.parse import parse_qsl, urlsplit
+from xml.etree import ElementTree
+
+try:
+    import resource
+except ImportError:  # Windows: --page-memory is not enforced
+    resource = None
+
+
+# Library code reports notes and warnings here instead of printing; the CLI
+# shows them on stdout (see _log_to_stdout)
+log = logging.getLogger("doc_to_archive")
+log.addHandler(logging.NullHandler())
 
 
 # ── Helpers ──────────────────────────────────────────────────────────
 
+class ConversionError(Exception):
+    """A document cannot be converted (missing dependency, failed conversion, ...)."""
+
+
 def sanitize_filename(name: str) -> str:
     """Create a safe filename from a string."""
     clean = re.sub(r"[^a-z0-9_\-. ]", "", name, flags=re.IGNORECASE)
@@ -53,96 +120,931 @@ def ext_from_content_type(content_type: str) -> str:
     return mapping.get(content_type, "png")
 
 
+def _as_file(source: str | bytes):
+    """A document path as-is, or in-memory document bytes wrapped as a file object."""
+    return source if isinstance(source, str) else io.BytesIO(source)
+
+
+def format_bytes(size: int) -> str:
+    """Human-readable byte count."""
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+class TextBlock(NamedTuple):
+    """
+    One block of text as emitted by every processor. A tuple rather than a dict
+    keeps per-block overhead small on documents with hundreds of thousands of
+    blocks; it pickles compactly and serializes to a JSON list.
+    """
+    text: str
+    size: float
+    bold: bool
+    y: float
+    page: int
+
+
+# ── Profiling ────────────────────────────────────────────────────────
+
+class Profiler:
+    """
+    Collects per-stage wall time, per-page timings, counters and tracemalloc
+    peaks for --profile. Stages may nest; an outer stage's time includes its
+    inner stages. Picklable, so worker processes return their own Profiler and
+    the parent merge()s it.
+    """
+
+    def __init__(self):
+        self.stages: dict[str, float] = {}
+        self.calls: dict[str, int] = {}
+        self.memory_peaks: dict[str, int] = {}
+        self.page_seconds: dict[int, float] = {}
+        self.counters: dict[str, int] = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str, memory: bool = False):
+        """
+        Time a block under name. With memory=True (top-level stages only) also
+        record the tracemalloc peak reached inside it.
+        """
+        trace = memory and tracemalloc.is_tracing()
+        if trace:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if trace:
+                self.memory_peaks[name] = max(self.memory_peaks.get(name, 0), tracemalloc.get_traced_memory()[1])
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def page(self, page_num: int, seconds: float) -> None:
+        self.page_seconds[page_num] = self.page_seconds.get(page_num, 0.0) + seconds
+
+    def merge(self, other: "Profiler") -> None:
+        for name, seconds in other.stages.items():
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+            self.calls[name] = self.calls.get(name, 0) + other.calls[name]
+        for name, n in other.counters.items():
+            self.count(name, n)
+        for page_num, seconds in other.page_seconds.items():
+            self.page(page_num, seconds)
+
+    def report(self, slowest: int = 10) -> dict:
+        """Build the JSON-serializable report. Page numbers are 1-based."""
+        ranked = sorted(self.page_seconds.items(), key=lambda kv: kv[1], reverse=True)
+        return {
+            "stages": {
+                name: {"seconds": round(seconds, 6), "calls": self.calls[name]}
+                for name, seconds in self.stages.items()
+            },
+            "memory_peak_bytes": dict(self.memory_peaks),
+            "counters": dict(self.counters),
+            "pages": {
+                "count": len(self.page_seconds),
+                "total_seconds": round(sum(self.page_seconds.values()), 6),
+                "slowest": [{"page": p + 1, "seconds": round(t, 6)} for p, t in ranked[:slowest]],
+                "seconds_by_page": [round(self.page_seconds[p], 6) for p in sorted(self.page_seconds)],
+            },
+        }
+
+
+# Shared do-nothing profiler for callers that do not profile
+class _NullProfiler(Profiler):
+    @contextlib.contextmanager
+    def stage(self, name: str, memory: bool = False):
+        yield
+
+    def count(self, name: str, n: int = 1) -> None:
+        pass
+
+    def page(self, page_num: int, seconds: float) -> None:
+        pass
+
+
+NULL_PROFILER = _NullProfiler()
+
+
+# ── Extraction cache ─────────────────────────────────────────────────
+
+# Bump whenever extraction output changes so stale cache entries are ignored
+EXTRACTION_VERSION = 4
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "funtell", "doc-to-archive",
+)
+
+
+def file_sha256(source: str | bytes) -> str:
+    """Hash a file's contents in chunks (or in-memory document bytes at once)."""
+    if isinstance(source, bytes):
+        return hashlib.sha256(source).hexdigest()
+    h = hashlib.sha256()
+    with open(source, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Content-addressed on-disk cache of extraction results (text blocks and image
+    references, never image bytes). Entries are JSON files named by key; reads
+    refresh an entry's mtime and prune() evicts least recently used entries
+    until the cache fits in max_bytes. Safe to share between processes.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, *parts) -> str:
+        """Build a cache key from the extraction version and any key parts."""
+        return hashlib.sha256(repr((EXTRACTION_VERSION, *parts)).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def spool_path(self, key: str) -> str:
+        """Location of a whole-document PageSpool entry (JSON lines, see PageSpool)."""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.jsonl")
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value) -> None:
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except OSError:
+            pass  # Caching is best effort
+
+    def prune(self) -> None:
+        """Evict least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
 # ── PDF processing ───────────────────────────────────────────────────
 
 def _check_pymupdf():
     try:
-        import fitz
+        # PyMuPDF prints a deprecation notice on "import fitz"
+        import pymupdf as fitz
         return fitz
     except ImportError:
-        print("Error: pymupdf is required for PDF files. Install with:")
-        print("  pip install pymupdf")
-        sys.exit(1)
+        raise ConversionError("pymupdf is required for PDF files. Install with:\n  pip install pymupdf") from None
+
+
+def _open_pdf(source: str | bytes):
+    """Open a PDF from a path or from in-memory bytes."""
+    fitz = _check_pymupdf()
+    try:
+        if isinstance(source, str):
+            return fitz.open(source)
+        return fitz.open(stream=source, filetype="pdf")
+    except RuntimeError as e:  # PyMuPDF's FileDataError and FileNotFoundError
+        raise ConversionError(f"Cannot open PDF: {e}") from e
+
 
+def _block_sizes(blocks: list[TextBlock]):
+    """Rounded font sizes of the blocks heading detection counts (with text and a known size)."""
+    return (round(b.size, 1) for b in blocks if b.size and b.text.strip())
 
-def _detect_heading_threshold(blocks: list[dict]) -> float:
+
+def _detect_heading_threshold(blocks: list[TextBlock]) -> float:
     """Determine font size threshold separating headings from body."""
-    sizes = [b["size"] for b in blocks if b["type"] == "text" and b["text"].strip()]
+    return _heading_threshold(Counter(_block_sizes(blocks)))
+
+
+def _heading_threshold(sizes: Counter) -> float:
+    """Heading threshold from counts of rounded block font sizes (most common = body)."""
     if not sizes:
         return 999
-    body_size = Counter(round(s, 1) for s in sizes).most_common(1)[0][0]
+    body_size = sizes.most_common(1)[0][0]
     return body_size * 1.2
 
 
-def _extract_pdf_text_blocks(page, fitz) -> list[dict]:
+def _extract_pdf_text_blocks(page, fitz, profiler: Profiler = NULL_PROFILER) -> list[TextBlock]:
     """Extract text blocks with font size and position from a PDF page."""
     blocks = []
-    text_dict = page.get_text("dict", flags=fitz.TEXT_PRESERVE_WHITESPACE)
+    with profiler.stage("get_text"):
+        text_dict = page.get_text("dict", flags=fitz.TEXT_PRESERVE_WHITESPACE)
     for block in text_dict.get("blocks", []):
         if block["type"] != 0:
             continue
-        full_text = ""
+        parts: list[str] = []
         max_size = 0
         is_bold = False
         for line in block.get("lines", []):
             for span in line.get("spans", []):
-                full_text += span["text"]
+                parts.append(span["text"])
                 if span["size"] > max_size:
                     max_size = span["size"]
                 if "bold" in span.get("font", "").lower():
                     is_bold = True
-            full_text += "\n"
-        text = full_text.strip()
+            parts.append("\n")
+        text = "".join(parts).strip()
         if text:
-            blocks.append({
-                "type": "text", "text": text, "size": max_size,
-                "bold": is_bold, "y": block["bbox"][1], "page": page.number,
-            })
+            blocks.append(TextBlock(text, max_size, is_bold, block["bbox"][1], page.number))
+    return blocks
+
+
+def _extract_pdf_text_blocks_fast(page, fitz, profiler: Profiler = NULL_PROFILER) -> list[TextBlock]:
+    """
+    --fast-text variant of _extract_pdf_text_blocks: block text and position
+    come from the "blocks" output, and font size / bold are read from the
+    first and last character of each line in MuPDF's own text page, so no
+    span dicts are built. A larger or bold span in the middle of a line is
+    not counted.
+    """
+    mupdf = fitz.mupdf
+    with profiler.stage("get_text"):
+        textpage = page.get_textpage(flags=fitz.TEXT_PRESERVE_WHITESPACE)
+        block_infos = textpage.extractBLOCKS()
+    page_area = textpage.this.m_internal.mediabox
+    blocks = []
+    # block_infos skips empty blocks, so walk MuPDF's block list alongside it
+    block, block_num = textpage.this.m_internal.first_block, 0
+    for _, y0, _, _, text, num, block_type in block_infos:
+        text = text.strip()
+        if block_type != 0 or not text:
+            continue
+        while block_num < num:
+            block, block_num = block.next, block_num + 1
+        # Like "dict", ignore lines outside the page; only a block crossing its edge has any
+        bbox = block.bbox
+        clipped = not (bbox.x0 >= page_area.x0 and bbox.y0 >= page_area.y0
+                       and bbox.x1 <= page_area.x1 and bbox.y1 <= page_area.y1)
+        max_size = 0
+        is_bold = False
+        line = mupdf.FzStextBlock(block).begin().__ref__().m_internal
+        while line is not None:
+            if line.first_char is not None and not (clipped and _outside(line.bbox, page_area)):
+                for char in (line.first_char, line.last_char):
+                    if char.size > max_size:
+                        max_size = char.size
+                    if not is_bold and "bold" in mupdf.ll_fz_font_name(char.font).lower():
+                        is_bold = True
+            line = line.next
+        blocks.append(TextBlock(text, max_size, is_bold, y0, page.number))
     return blocks
 
 
-def _extract_pdf_images(page, doc) -> list[dict]:
-    """Extract images from a PDF page with their position."""
+@functools.cache
+def _fast_text_supported() -> bool:
+    """
+    Whether _extract_pdf_text_blocks_fast works with the installed PyMuPDF.
+    It reads MuPDF's text page through the low-level bindings, which are not
+    a stable API, so it is tried on a small generated page and must agree
+    with _extract_pdf_text_blocks. Logs a warning once when it does not.
+    """
+    fitz = _check_pymupdf()
+    doc = fitz.open()
+    try:
+        page = doc.new_page()
+        page.insert_text((72, 72), "Heading", fontsize=18, fontname="hebo")
+        page.insert_text((72, 120), "Body text", fontsize=10)
+        supported = _extract_pdf_text_blocks_fast(page, fitz) == _extract_pdf_text_blocks(page, fitz)
+    except Exception:
+        supported = False
+    finally:
+        doc.close()
+    if not supported:
+        log.warning(f"Warning: --fast-text is not supported by PyMuPDF {fitz.VersionBind}; "
+                    f"using the standard text extraction")
+    return supported
+
+
+def _outside(rect, area) -> bool:
+    """Whether a MuPDF rect has no overlap with area."""
+    return rect.x1 <= area.x0 or rect.y1 <= area.y0 or rect.x0 >= area.x1 or rect.y0 >= area.y1
+
+
+def _extract_pdf_images(page, profiler: Profiler = NULL_PROFILER) -> list[dict]:
+    """
+    Locate images on a PDF page without decoding them.
+    Returns records with xref/y/page, one per image on the page; an image
+    repeated on other pages is reported there too. Bytes are pulled later
+    by PdfImageLoader.
+    """
     images = []
     seen_xrefs = set()
-    for img_info in page.get_images(full=True):
-        xref = img_info[0]
+    with profiler.stage("get_images"):
+        img_infos = page.get_images(full=True)
+    for img_info in img_infos:
+        xref, width, height = img_info[0], img_info[2], img_info[3]
         if xref in seen_xrefs:
             continue
         seen_xrefs.add(xref)
+        if width < 50 or height < 50:
+            continue
         try:
-            img_data = doc.extract_image(xref)
-            if not img_data or not img_data.get("image"):
-                continue
-            if img_data.get("width", 0) < 50 or img_data.get("height", 0) < 50:
-                continue
-            img_rects = page.get_image_rects(xref)
-            y_pos = img_rects[0].y0 if img_rects else 0
-            images.append({
-                "data": img_data["image"],
-                "ext": img_data.get("ext", "jpg"),
-                "y": y_pos, "page": page.number,
-            })
+            with profiler.stage("get_image_rects"):
+                img_rects = page.get_image_rects(xref)
         except Exception:
             continue
+        y_pos = img_rects[0].y0 if img_rects else 0
+        images.append({"xref": xref, "y": y_pos, "page": page.number})
     return images
 
 
-def process_pdf(file_path: str) -> tuple[list[dict], list[dict], list[dict]]:
+class PdfImageLoader:
     """
-    Process a PDF file.
-    Returns (text_blocks, images, []) where text_blocks have type/text/size/bold/y/page
-    and images have data/ext/y/page.
+    Pulls image bytes from a PDF on demand. The document is opened on first use
+    and closed when the last image record referencing this loader is released.
+    """
+
+    def __init__(self, source: str | bytes, profiler: Profiler = NULL_PROFILER):
+        self.source = source
+        self.profiler = profiler
+        self._doc = None
+
+    def load(self, xref: int) -> tuple[bytes, str] | None:
+        """Return (data, ext) for an image xref, or None if it cannot be extracted."""
+        if self._doc is None:
+            self._doc = _open_pdf(self.source)
+        try:
+            with self.profiler.stage("extract_image"):
+                img_data = self._doc.extract_image(xref)
+        except Exception:
+            return None
+        if not img_data or not img_data.get("image"):
+            return None
+        self.profiler.count("images_extracted")
+        self.profiler.count("image_bytes_extracted", len(img_data["image"]))
+        return img_data["image"], img_data.get("ext", "jpg")
+
+    def __del__(self):
+        if self._doc is not None:
+            self._doc.close()
+
+
+def _pdf_page_hash(page, doc, stream_hashes: dict[int, str]) -> str:
+    """
+    Hash everything page extraction depends on: geometry, content stream, fonts,
+    and the raw streams of its images and form XObjects. Image xrefs are part
+    of the hash, so cached image references stay valid for the new file.
+    """
+    h = hashlib.sha256()
+    h.update(repr((tuple(page.rect), page.rotation, page.get_fonts(full=True))).encode())
+    h.update(page.read_contents())
+    for info in page.get_images(full=True) + page.get_xobjects():
+        xref = info[0]
+        if xref not in stream_hashes:
+            stream_hashes[xref] = hashlib.sha256(doc.xref_stream_raw(xref) or b"").hexdigest()
+        h.update(repr(info).encode())
+        h.update(stream_hashes[xref].encode())
+    return h.hexdigest()
+
+
+def _iter_pdf_page_range(
+    source: str | bytes, page_nums: Sequence[int], cache_dir: str | None = None,
+    profiler: Profiler = NULL_PROFILER, fast_text: bool = False,
+):
+    """
+    Yield (blocks, images) for each of page_nums (0-based, ascending) of a PDF.
+    Opens its own document so it can run inside a worker process.
+    With cache_dir, each page's result is cached under its page hash.
     """
     fitz = _check_pymupdf()
-    doc = fitz.open(file_path)
-    all_blocks: list[dict] = []
-    all_images: list[dict] = []
-    for page in doc:
-        all_blocks.extend(_extract_pdf_text_blocks(page, fitz))
-        all_images.extend(_extract_pdf_images(page, doc))
+    doc = _open_pdf(source)
+    cache = ExtractionCache(cache_dir) if cache_dir else None
+    stream_hashes: dict[int, str] = {}
+    for page_num in page_nums:
+        page_start = time.perf_counter()
+        blocks, images = _extract_pdf_page(doc, page_num, fitz, cache, stream_hashes, profiler, fast_text)
+        profiler.page(page_num, time.perf_counter() - page_start)
+        yield blocks, images
+    doc.close()
+    if cache:
+        profiler.count("cache_page_hits", cache.hits)
+        profiler.count("cache_page_misses", cache.misses)
+
+
+def _extract_pdf_text_blocks_fast_or_standard(page, fitz, profiler: Profiler = NULL_PROFILER) -> list[TextBlock]:
+    """_extract_pdf_text_blocks_fast, or _extract_pdf_text_blocks if MuPDF's text page is not what it expects."""
+    try:
+        return _extract_pdf_text_blocks_fast(page, fitz, profiler)
+    except (AttributeError, TypeError, RuntimeError) as e:
+        log.warning(f"Warning: page {page.number + 1}: --fast-text failed ({e}); using the standard text extraction")
+        return _extract_pdf_text_blocks(page, fitz, profiler)
+
+
+def _extract_pdf_page(
+    doc, page_num: int, fitz, cache: ExtractionCache | None, stream_hashes: dict[int, str],
+    profiler: Profiler = NULL_PROFILER, fast_text: bool = False,
+) -> tuple[list[TextBlock], list[dict]]:
+    """
+    The (blocks, images) of one page; with cache, the result is cached under
+    the page hash. fast_text picks _extract_pdf_text_blocks_fast, falling back to
+    _extract_pdf_text_blocks on a page it fails on.
+    """
+    page = doc[page_num]
+    extract_text = _extract_pdf_text_blocks_fast_or_standard if fast_text else _extract_pdf_text_blocks
+    if cache is None:
+        return extract_text(page, fitz, profiler), _extract_pdf_images(page, profiler)
+    with profiler.stage("page_hash"):
+        key = cache.key("pdf-page", _pdf_page_hash(page, doc, stream_hashes), *(("fast",) if fast_text else ()))
+    entry = cache.get(key)
+    if entry is None:
+        entry = {
+            "blocks": extract_text(page, fitz, profiler),
+            "images": _extract_pdf_images(page, profiler),
+        }
+        cache.put(key, entry)
+    # Identical pages may sit at another index, so re-stamp the page number
+    blocks = [TextBlock(text, size, bold, y, page_num) for text, size, bold, y, _ in entry["blocks"]]
+    for img in entry["images"]:
+        img["page"] = page_num
+    return blocks, entry["images"]
+
+
+def _extract_pdf_page_text_only(page, fitz) -> tuple[list[TextBlock], list[dict]]:
+    """
+    Cheap retry for a page over its budget: plain text blocks without span
+    details, so with no font size (never headings) or bold, and no images
+    (a broken image stream is a common culprit).
+    """
+    blocks = []
+    for _, y0, _, _, text, _, block_type in page.get_text("blocks", flags=fitz.TEXT_PRESERVE_WHITESPACE):
+        text = text.strip()
+        if block_type == 0 and text:
+            blocks.append(TextBlock(text, 0.0, False, y0, page.number))
+    return blocks, []
+
+
+def _extract_pdf_page_range(
+    source: str | bytes, page_nums: Sequence[int], cache_dir: str | None = None, profile: bool = False,
+    fast_text: bool = False,
+) -> tuple[list[tuple[list[TextBlock], list[dict]]], Profiler | None]:
+    """
+    Worker entry point: the (blocks, images) of each of page_nums.
+    With profile, also returns a Profiler holding this range's timings.
+    """
+    profiler = Profiler() if profile else NULL_PROFILER
+    pages = list(_iter_pdf_page_range(source, page_nums, cache_dir, profiler, fast_text))
+    return pages, profiler if profile else None
+
+
+class DegradedPage(NamedTuple):
+    """A page extracted in a cheaper mode or skipped; page is 1-based."""
+    page: int
+    reason: str
+    outcome: str  # "text only" or "skipped"
+
+
+class PageBudget:
+    """
+    Per-page limits for PDF extraction (--page-timeout, --page-memory). With
+    a budget, pages are extracted one at a time in worker processes that can
+    be killed. A page that runs out of time or memory, raises, or crashes
+    its worker is retried text-only, and skipped if that fails too; degraded
+    collects what happened to each such page for the report.
+    """
+
+    def __init__(self, seconds: float = 0, memory_bytes: int = 0):
+        self.seconds = seconds or None
+        self.memory_bytes = memory_bytes or None
+        self.degraded: dict[int, DegradedPage] = {}
+
+    def report(self) -> list[DegradedPage]:
+        return [self.degraded[p] for p in sorted(self.degraded)]
+
+
+def _current_vm_bytes() -> int | None:
+    """This process's address-space size, where /proc exposes it (Linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * resource.getpagesize()
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+@contextlib.contextmanager
+def _memory_limit(limit_bytes: int | None):
+    """
+    Let the block allocate at most limit_bytes more address space: MuPDF and
+    Python allocations past it fail (RuntimeError / MemoryError) instead of
+    exhausting the machine. A no-op where RLIMIT_AS cannot be applied.
+    """
+    current = _current_vm_bytes() if limit_bytes else None
+    if current is None:
+        yield
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    cap = current + limit_bytes
+    if hard != resource.RLIM_INFINITY:
+        cap = min(cap, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (cap, hard))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+
+def _isolated_page_worker(conn, source: str | bytes, cache_dir: str | None,
+                          memory_bytes: int | None, profile: bool, fast_text: bool = False) -> None:
+    """
+    Isolated worker: extract the pages the parent sends as (page_num, text_only)
+    one at a time, under the memory limit, replying (blocks, images, profiler,
+    error) for each. Stops when the parent sends None or goes away.
+    """
+    tracemalloc.stop()
+    fitz = _check_pymupdf()
+    doc = _open_pdf(source)
+    cache = ExtractionCache(cache_dir) if cache_dir else None
+    stream_hashes: dict[int, str] = {}
+    conn.send("ready")
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        page_num, text_only = request
+        profiler = Profiler() if profile else NULL_PROFILER
+        try:
+            with _memory_limit(memory_bytes):
+                if text_only:
+                    blocks, images = _extract_pdf_page_text_only(doc[page_num], fitz)
+                else:
+                    blocks, images = _extract_pdf_page(
+                        doc, page_num, fitz, cache, stream_hashes, profiler, fast_text,
+                    )
+        except Exception as e:
+            # MuPDF reports a refused allocation as "malloc (N bytes) failed" and the like
+            if memory_bytes and (isinstance(e, MemoryError) or re.search(r"alloc\b.*\bfailed", str(e))):
+                reason = f"exceeded the {memory_bytes // (1024 * 1024)} MB memory budget"
+            else:
+                reason = f"failed ({e})"
+            conn.send((None, None, None, reason))
+            continue
+        conn.send((blocks, images, profiler if profile else None, None))
     doc.close()
-    return all_blocks, all_images, []
+
+
+class _IsolatedWorker:
+    """Parent-side handle of one _isolated_page_worker process and its current page."""
+
+    def __init__(
+        self, source: str | bytes, cache_dir: str | None, budget: PageBudget, profile: bool,
+        fast_text: bool = False,
+    ):
+        import multiprocessing
+
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_isolated_page_worker,
+            args=(child_conn, source, cache_dir, budget.memory_bytes, profile, fast_text),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.job: tuple[int, bool] | None = None
+        self.started = 0.0
+        try:
+            self.conn.recv()  # "ready": opening the document does not count against a page
+        except EOFError:
+            self.process.join()
+            raise ConversionError("PDF worker process exited during start-up") from None
+
+    def send(self, job: tuple[int, bool]) -> None:
+        self.job = job
+        self.started = time.perf_counter()
+        self.conn.send(job)
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+    def stop(self) -> None:
+        with contextlib.suppress(OSError):
+            self.conn.send(None)
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+def _iter_pdf_pages_isolated(
+    source: str | bytes, page_nums: Sequence[int], workers: int, cache_dir: str | None,
+    profiler: Profiler, budget: PageBudget, fast_text: bool = False,
+):
+    """
+    Yield (page_num, blocks, images) for each of page_nums, in order, from
+    isolated workers that each hold one page at a time. A worker whose page
+    exceeds budget.seconds is killed and replaced; that page, or one that
+    failed or crashed its worker, is queued again text-only, then skipped.
+    """
+    from multiprocessing.connection import wait
+
+    profile = profiler is not NULL_PROFILER
+    index_of = {page_num: i for i, page_num in enumerate(page_nums)}
+    pending: deque = deque((page_num, False) for page_num in page_nums)
+    first_failure: dict[int, str] = {}
+    done: dict[int, tuple[list[TextBlock], list[dict]]] = {}
+    # Pages are handed out at most this far ahead of the next one yielded
+    window = max(1, workers) * 4
+    next_index = 0
+    pool: list[_IsolatedWorker | None] = [None] * max(1, min(workers, len(page_nums)))
+
+    def failed(page_num: int, text_only: bool, reason: str) -> None:
+        if not text_only:
+            log.warning(f"Warning: page {page_num + 1} {reason}; retrying text only")
+            first_failure[page_num] = reason
+            pending.appendleft((page_num, True))
+            return
+        log.warning(f"Warning: page {page_num + 1} {reason} in text-only mode as well; skipped")
+        budget.degraded[page_num] = DegradedPage(page_num + 1, first_failure.pop(page_num), "skipped")
+        profiler.count("pages_skipped")
+        done[page_num] = ([], [])
+
+    try:
+        while next_index < len(page_nums):
+            for slot, worker in enumerate(pool):
+                if worker is not None and worker.job is not None:
+                    continue
+                if not pending or index_of[pending[0][0]] >= next_index + window:
+                    break
+                if worker is None:
+                    worker = pool[slot] = _IsolatedWorker(source, cache_dir, budget, profile, fast_text)
+                worker.send(pending.popleft())
+
+            busy = [w for w in pool if w is not None and w.job is not None]
+            timeout = None
+            if budget.seconds:
+                timeout = max(0.0, min(w.started + budget.seconds for w in busy) - time.perf_counter())
+            ready = wait([w.conn for w in busy] + [w.process.sentinel for w in busy], timeout)
+
+            for slot, worker in enumerate(pool):
+                if worker is None or worker.job is None:
+                    continue
+                page_num, text_only = worker.job
+                elapsed = time.perf_counter() - worker.started
+                if worker.conn in ready or worker.process.sentinel in ready:
+                    try:
+                        blocks, images, page_profiler, error = worker.conn.recv()
+                    except (EOFError, OSError):
+                        worker.kill()
+                        pool[slot] = None
+                        failed(page_num, text_only, f"crashed its worker (exit code {worker.process.exitcode})")
+                        continue
+                    worker.job = None
+                    profiler.page(page_num, elapsed)
+                    if error:
+                        failed(page_num, text_only, error)
+                        continue
+                    if page_profiler:
+                        profiler.merge(page_profiler)
+                    if text_only:
+                        budget.degraded[page_num] = DegradedPage(
+                            page_num + 1, first_failure.pop(page_num), "text only",
+                        )
+                        profiler.count("pages_text_only")
+                    done[page_num] = (blocks, images)
+                elif budget.seconds and elapsed >= budget.seconds:
+                    worker.kill()
+                    pool[slot] = None
+                    profiler.page(page_num, elapsed)
+                    failed(page_num, text_only, f"exceeded the {budget.seconds:g}s time budget")
+
+            while next_index < len(page_nums) and page_nums[next_index] in done:
+                page_num = page_nums[next_index]
+                blocks, images = done.pop(page_num)
+                next_index += 1
+                yield page_num, blocks, images
+    finally:
+        for worker in pool:
+            if worker is not None:
+                worker.stop()
+
+
+# Most pages in one parallel extraction shard; results are held a whole shard at a time
+PDF_SHARD_PAGES = 16
+
+
+def _page_shards(page_count: int, workers: int) -> list[tuple[int, int]]:
+    """Split page_count pages into contiguous (start, end) ranges, a few per worker."""
+    # Several shards per worker keeps the pool busy when some pages are much heavier
+    shard_count = min(page_count, max(workers * 4, -(-page_count // PDF_SHARD_PAGES)))
+    size, extra = divmod(page_count, shard_count)
+    shards = []
+    start = 0
+    for i in range(shard_count):
+        end = start + size + (1 if i < extra else 0)
+        shards.append((start, end))
+        start = end
+    return shards
+
+
+def parse_page_ranges(spec: str) -> tuple[tuple[int, int | None], ...]:
+    """
+    Parse a 1-based page selection such as "10-120,300-" into (first, last)
+    pairs; last is None for an open-ended range. Raises ValueError.
+    """
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        try:
+            start = int(first) if first.strip() else 1
+            end = (int(last) if last.strip() else None) if sep else start
+        except ValueError:
+            raise ValueError(f"invalid page range '{part}'") from None
+        if start < 1 or (end is not None and end < start):
+            raise ValueError(f"invalid page range '{part}'")
+        ranges.append((start, end))
+    if not ranges:
+        raise ValueError("no pages selected")
+    return tuple(ranges)
+
+
+def _select_pages(page_count: int, page_ranges: tuple | None = None) -> Sequence[int]:
+    """0-based page numbers picked by parse_page_ranges() output, ascending and unique."""
+    if not page_ranges:
+        return range(page_count)
+    selected: set[int] = set()
+    for first, last in page_ranges:
+        selected.update(range(first - 1, min(last or page_count, page_count)))
+    return sorted(selected)
+
+
+def process_pdf(
+    source: str | bytes, workers: int = 1, cache: ExtractionCache | None = None,
+    profiler: Profiler = NULL_PROFILER, page_ranges: tuple | None = None, fast_text: bool = False,
+) -> tuple[list[TextBlock], list[dict], list[dict]]:
+    """
+    Process a PDF file, or only the pages in page_ranges (see parse_page_ranges).
+    Returns (text_blocks, images, []) where text_blocks are TextBlock records
+    and images have key/load/y/page. Each image appears once per page it is
+    on, and its bytes are only extracted when load() is called.
+    Whole-document wrapper around extract_document; see _iter_pdf_chunks.
+    """
+    return _collect_spool(extract_document(
+        source, workers, cache, profiler, page_ranges, kind="pdf", fast_text=fast_text,
+    ))
+
+
+def _pdf_page_numbers(source: str | bytes, page_ranges: tuple | None = None) -> Sequence[int]:
+    """The 0-based pages of a PDF to extract; warns when page_ranges selects none."""
+    doc = _open_pdf(source)
+    page_count = doc.page_count
+    doc.close()
+    page_nums = _select_pages(page_count, page_ranges)
+    if not page_nums:
+        log.warning(f"Warning: --pages selects none of the document's {page_count} pages")
+    return page_nums
+
+
+def _iter_pdf_chunks(
+    source: str | bytes, workers: int = 1, cache_dir: str | None = None, profiler: Profiler = NULL_PROFILER,
+    page_ranges: tuple | None = None, budget: PageBudget | None = None, fast_text: bool = False,
+):
+    """
+    Yield (blocks, images, frontier) page by page; later pages start at frontier.
+    Pages outside page_ranges are never opened.
+
+    With workers > 1, page ranges are extracted in separate processes and
+    yielded back in page order, so the result is identical to the serial path;
+    only about two shards per worker are in flight at a time.
+    With cache_dir, only pages whose content changed are re-extracted.
+    With a budget, every page is extracted in an isolated worker instead
+    (see PageBudget), on up to workers processes. fast_text extracts text
+    with _extract_pdf_text_blocks_fast.
+    """
+    profile = profiler is not NULL_PROFILER
+    page_nums = _pdf_page_numbers(source, page_ranges)
+
+    if budget is not None:
+        for page_num, blocks, images in _iter_pdf_pages_isolated(
+            source, page_nums, workers, cache_dir, profiler, budget, fast_text,
+        ):
+            yield blocks, images, (page_num + 1, None)
+        return
+
+    if workers <= 1 or len(page_nums) < 2:
+        for page_num, (blocks, images) in zip(
+            page_nums, _iter_pdf_page_range(source, page_nums, cache_dir, profiler, fast_text),
+        ):
+            yield blocks, images, (page_num + 1, None)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    shards = [page_nums[start:end] for start, end in _page_shards(len(page_nums), workers)]
+    # Forked workers would inherit --profile's tracemalloc; only the parent is traced
+    pool = ProcessPoolExecutor(max_workers=min(workers, len(shards)), initializer=tracemalloc.stop)
+    with pool:
+        queued = iter(shards)
+        in_flight: deque = deque()
+        # Collect in submission order so pages stay in order
+        while True:
+            while len(in_flight) < workers * 2 and (shard := next(queued, None)) is not None:
+                future = pool.submit(_extract_pdf_page_range, source, shard, cache_dir, profile, fast_text)
+                in_flight.append((shard, future))
+            if not in_flight:
+                break
+            shard, future = in_flight.popleft()
+            pages, range_profiler = future.result()
+            del future  # it holds the shard's pages too; release them with pages
+            if range_profiler:
+                profiler.merge(range_profiler)
+            for page_num, (blocks, images) in zip(shard, pages):
+                yield blocks, images, (page_num + 1, None)
+
+
+def sample_pdf_heading_threshold(
+    source: str | bytes, sample_size: int, page_ranges: tuple | None = None,
+    cache_dir: str | None = None, profiler: Profiler = NULL_PROFILER, budget: PageBudget | None = None,
+    fast_text: bool = False,
+) -> float:
+    """
+    Estimate the heading threshold from at most sample_size randomly chosen
+    pages (of page_ranges, if given) instead of every block in the document.
+    Sampled pages land in the page cache, so with cache_dir the main pass
+    does not extract them again. With a budget they are extracted in
+    isolated workers.
+    """
+    page_nums = _pdf_page_numbers(source, page_ranges)
+    # Fixed seed: the same document always gets the same threshold
+    sample = sorted(random.Random(0).sample(page_nums, min(sample_size, len(page_nums))))
+    sizes: Counter = Counter()
+    with profiler.stage("sample_threshold"):
+        if budget is not None:
+            pages = (blocks for _, blocks, _ in _iter_pdf_pages_isolated(
+                source, sample, 1, cache_dir, NULL_PROFILER, budget, fast_text,
+            ))
+        else:
+            pages = (blocks for blocks, _ in _iter_pdf_page_range(
+                source, sample, cache_dir, fast_text=fast_text,
+            ))
+        for blocks in pages:
+            sizes.update(_block_sizes(blocks))
+    profiler.count("threshold_sample_pages", len(sample))
+    return _heading_threshold(sizes)
+
+
+def _pdf_image_attacher(source: str | bytes, profiler: Profiler = NULL_PROFILER) -> Callable[[dict], dict | None]:
+    """
+    Return attach(img) for PageSpool: gives each image a lazy load() and its
+    xref as key, so StructureBuilder decodes a repeated image only once.
+    """
+    loader = PdfImageLoader(source, profiler)
+
+    def attach(img: dict) -> dict:
+        xref = img.pop("xref")
+        img["key"] = xref
+        img["load"] = functools.partial(loader.load, xref)
+        return img
+
+    return attach
 
 
 # ── DOC to DOCX conversion ─────────────────────────────────────────
@@ -164,6 +1066,21 @@ def _find_libreoffice() -> str | None:
     return None
 
 
+def _run_libreoffice(
+    libreoffice: str, doc_paths: list[str], outdir: str,
+    profile_dir: str | None = None, timeout: int = 60,
+) -> subprocess.CompletedProcess:
+    """
+    Convert one or more .doc files to .docx in a single headless LibreOffice run.
+    A separate profile_dir lets several instances run side by side.
+    """
+    cmd = [libreoffice, "--headless"]
+    if profile_dir:
+        cmd.append(f"-env:UserInstallation=file://{os.path.abspath(profile_dir)}")
+    cmd += ["--convert-to", "docx", "--outdir", outdir, *doc_paths]
+    return subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+
+
 def convert_doc_to_docx(doc_path: str) -> str:
     """
     Convert legacy .doc file to .docx using LibreOffice headless mode.
@@ -171,53 +1088,104 @@ def convert_doc_to_docx(doc_path: str) -> str:
     """
     libreoffice = _find_libreoffice()
     if not libreoffice:
-        print("Error: LibreOffice is required to process .doc files.")
-        print("Install from: https://www.libreoffice.org/download")
-        print("\nAlternatively, convert your .doc file to .docx manually and try again.")
-        sys.exit(1)
+        raise ConversionError(
+            "LibreOffice is required to process .doc files.\n"
+            "Install from: https://www.libreoffice.org/download\n"
+            "\nAlternatively, convert your .doc file to .docx manually and try again."
+        )
 
     # Create temporary directory for conversion
     temp_dir = tempfile.mkdtemp(prefix="doc2docx_")
 
     try:
-        print(f"Converting .doc to .docx using LibreOffice...")
+        log.info(f"Converting .doc to .docx using LibreOffice...")
         # Run LibreOffice in headless mode to convert
-        result = subprocess.run(
-            [
-                libreoffice,
-                "--headless",
-                "--convert-to", "docx",
-                "--outdir", temp_dir,
-                doc_path
-            ],
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
+        try:
+            result = _run_libreoffice(libreoffice, [doc_path], temp_dir)
+        except subprocess.TimeoutExpired:
+            raise ConversionError("LibreOffice conversion timed out (>60s)") from None
+        except OSError as e:
+            raise ConversionError(f"LibreOffice could not be started: {e}") from e
 
         if result.returncode != 0:
-            print(f"Error: LibreOffice conversion failed.")
-            print(f"stdout: {result.stdout}")
-            print(f"stderr: {result.stderr}")
-            sys.exit(1)
+            raise ConversionError(
+                f"LibreOffice conversion failed.\nstdout: {result.stdout}\nstderr: {result.stderr}"
+            )
 
         # Find the converted .docx file
         base_name = os.path.splitext(os.path.basename(doc_path))[0]
         docx_path = os.path.join(temp_dir, f"{base_name}.docx")
 
         if not os.path.isfile(docx_path):
-            print(f"Error: Converted file not found at {docx_path}")
-            sys.exit(1)
+            raise ConversionError(f"Converted file not found at {docx_path}")
 
-        print(f"✓ Conversion successful: {docx_path}")
+        log.info(f"✓ Conversion successful: {docx_path}")
         return docx_path
 
-    except subprocess.TimeoutExpired:
-        print("Error: LibreOffice conversion timed out (>60s)")
-        sys.exit(1)
-    except Exception as e:
-        print(f"Error during conversion: {e}")
-        sys.exit(1)
+    except BaseException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+
+def convert_docs_to_docx(doc_paths: list[str], instances: int = 1) -> tuple[dict[str, str], str]:
+    """
+    Convert many .doc files with a few long-lived LibreOffice runs instead of one
+    cold start per file. Files are split into at most `instances` batches, each
+    converted by a single soffice call with its own profile, run concurrently.
+    Returns ({doc_path: docx_path}, temp_dir); files that failed to convert are
+    missing from the map. The caller removes temp_dir.
+    """
+    libreoffice = _find_libreoffice()
+    if not libreoffice:
+        raise ConversionError(
+            "LibreOffice is required to process .doc files.\n"
+            "Install from: https://www.libreoffice.org/download"
+        )
+
+    temp_dir = tempfile.mkdtemp(prefix="doc2docx_")
+
+    # Round-robin into batches; a batch never holds two files with the same
+    # base name, since they would overwrite each other in its output dir
+    batches: list[list[str]] = [[] for _ in range(max(1, min(instances, len(doc_paths))))]
+    batch_names: list[set[str]] = [set() for _ in batches]
+    for i, path in enumerate(doc_paths):
+        name = os.path.splitext(os.path.basename(path))[0].lower()
+        slot = i % len(batches)
+        while name in batch_names[slot]:
+            slot += 1
+            if slot == len(batches):
+                batches.append([])
+                batch_names.append(set())
+        batches[slot].append(path)
+        batch_names[slot].add(name)
+
+    def run_batch(index: int, paths: list[str]) -> dict[str, str]:
+        outdir = os.path.join(temp_dir, f"out{index}")
+        os.makedirs(outdir)
+        profile = os.path.join(temp_dir, f"profile{index}") if len(batches) > 1 else None
+        try:
+            result = _run_libreoffice(libreoffice, paths, outdir, profile, timeout=60 * len(paths))
+        except subprocess.TimeoutExpired:
+            log.warning(f"Warning: LibreOffice batch {index} timed out (>{60 * len(paths)}s)")
+            return {}
+        if result.returncode != 0:
+            log.warning(f"Warning: LibreOffice batch {index} failed: {result.stderr.strip()}")
+        converted = {}
+        for path in paths:
+            base_name = os.path.splitext(os.path.basename(path))[0]
+            docx_path = os.path.join(outdir, f"{base_name}.docx")
+            if os.path.isfile(docx_path):
+                converted[path] = docx_path
+        return converted
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    log.info(f"Converting {len(doc_paths)} .doc file(s) using {len(batches)} LibreOffice instance(s)...")
+    converted: dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=len(batches)) as pool:
+        for result in pool.map(run_batch, range(len(batches)), batches):
+            converted.update(result)
+    return converted, temp_dir
 
 
 # ── DOCX processing ─────────────────────────────────────────────────
@@ -227,313 +1195,2285 @@ def _check_docx():
         import docx
         return docx
     except ImportError:
-        print("Error: python-docx is required for Word files. Install with:")
-        print("  pip install python-docx")
-        sys.exit(1)
+        raise ConversionError("python-docx is required for Word files. Install with:\n"
+                              "  pip install python-docx") from None
+
+
+class DocxPartLoader:
+    """
+    Reads media parts straight from a .docx ZIP on demand. The ZIP is opened
+    (and its directory parsed) once, on first use, and closed when the last
+    image record referencing this loader is released.
+    """
+
+    def __init__(self, source: str | bytes):
+        self.source = source
+        self._zf = None
 
+    def load(self, part: str, ext: str) -> tuple[bytes, str] | None:
+        try:
+            if self._zf is None:
+                self._zf = zipfile.ZipFile(_as_file(self.source))
+            return self._zf.read(part), ext
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return None
+
+    def __del__(self):
+        if self._zf is not None:
+            self._zf.close()
+
+
+def _word_heading_level(style_name: str) -> int | None:
+    """Heading level of a lowercase Word style name ("heading 2" -> 2); None for other styles."""
+    if not style_name.startswith("heading"):
+        return None
+    try:
+        return int(style_name.replace("heading", "").strip())
+    except ValueError:
+        return 1
+
+
+def _word_text_block(text: str, heading_level: int | None, is_bold: bool, y: int) -> TextBlock:
+    """Text block for a Word paragraph, with headings mapped to virtual font sizes."""
+    # Map heading level to a virtual font size for consistency with PDF logic
+    if heading_level is not None:
+        size = max(24 - (heading_level - 1) * 4, 14)  # H1=24, H2=20, H3=16, H4=14
+    else:
+        size = 12  # body text
+    return TextBlock(text, size, is_bold or heading_level is not None, y, 0)
 
-def process_docx(file_path: str) -> tuple[list[dict], list[dict], list[dict]]:
+
+def process_docx(
+    source: str | bytes, cache: ExtractionCache | None = None, profiler: Profiler = NULL_PROFILER,
+) -> tuple[list[TextBlock], list[dict], list[dict]]:
     """
     Process a Word .docx file.
     Returns (text_blocks, images, []) matching the same structure as process_pdf.
+    Images carry ext/part and a lazy load(). Whole-document wrapper around
+    extract_document; see _iter_docx_chunks.
+    """
+    return _collect_spool(extract_document(source, cache=cache, profiler=profiler, kind="docx"))
+
+
+def _docx_image_attacher(source: str | bytes) -> Callable[[dict], dict | None]:
+    """Return attach(img) for PageSpool: media parts are read lazily through one open ZIP."""
+    loader = DocxPartLoader(source)
+
+    def attach(img: dict) -> dict:
+        img["key"] = img["part"]
+        img["load"] = functools.partial(loader.load, img["part"], img["ext"])
+        return img
+
+    return attach
+
+
+# WordprocessingML / DrawingML / OPC names used by the streaming parser
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+WP_NS = "{http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing}"
+A_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+R_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+PKG_CT_NS = "{http://schemas.openxmlformats.org/package/2006/content-types}"
+OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+STYLES_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"
+
+_ON_VALUES = ("1", "true", "on")
+# Run children that contribute text, as python-docx's Run.text maps them
+_RUN_TEXT = {
+    f"{W_NS}tab": "\t", f"{W_NS}ptab": "\t", f"{W_NS}cr": "\n", f"{W_NS}noBreakHyphen": "-",
+}
+
+
+def _docx_rels(zf: zipfile.ZipFile, part: str) -> dict[str, tuple[str, str | None]]:
+    """Relationships of a package part: {rId: (type, target part or None if external)}."""
+    base, name = posixpath.split(part)
+    rels_path = posixpath.join(base, "_rels", f"{name}.rels")
+    if rels_path not in zf.NameToInfo:
+        return {}
+    rels = {}
+    for rel in ElementTree.fromstring(zf.read(rels_path)).iter(f"{PKG_REL_NS}Relationship"):
+        target = rel.get("Target", "")
+        if rel.get("TargetMode") == "External":
+            target_part = None
+        elif target.startswith("/"):
+            target_part = target.lstrip("/")
+        else:
+            target_part = posixpath.normpath(posixpath.join(base, target))
+        rels[rel.get("Id")] = (rel.get("Type", ""), target_part)
+    return rels
+
+
+def _docx_content_type(content_types: ElementTree.Element, part: str) -> str:
+    """Content type of a part from [Content_Types].xml (override, else extension default)."""
+    for override in content_types.iter(f"{PKG_CT_NS}Override"):
+        if override.get("PartName", "").lstrip("/").lower() == part.lower():
+            return override.get("ContentType", "")
+    ext = posixpath.splitext(part)[1].lstrip(".").lower()
+    for default in content_types.iter(f"{PKG_CT_NS}Default"):
+        if default.get("Extension", "").lower() == ext:
+            return default.get("ContentType", "")
+    return ""
+
+
+def _docx_paragraph_styles(zf: zipfile.ZipFile, styles_part: str | None) -> tuple[dict[str, str], str]:
+    """
+    Read styles.xml into ({styleId: lowercase name} for paragraph styles, default
+    style name), resolving styles the way python-docx's get_by_id does.
+    """
+    if not styles_part or styles_part not in zf.NameToInfo:
+        return {}, ""
+    names: dict[str, str] = {}
+    default = ""
+    for style in ElementTree.fromstring(zf.read(styles_part)).iter(f"{W_NS}style"):
+        if style.get(f"{W_NS}type") != "paragraph":
+            continue
+        name_el = style.find(f"{W_NS}name")
+        name = (name_el.get(f"{W_NS}val", "") if name_el is not None else "").lower()
+        style_id = style.get(f"{W_NS}styleId")
+        if style_id is not None:
+            names.setdefault(style_id, name)
+        if style.get(f"{W_NS}default") in _ON_VALUES:
+            default = name  # the last default in document order wins
+    return names, default
+
+
+def _docx_run_text(run: ElementTree.Element) -> str:
+    parts = []
+    for child in run:
+        if child.tag == f"{W_NS}t":
+            parts.append(child.text or "")
+        elif child.tag == f"{W_NS}br":
+            if child.get(f"{W_NS}type", "textWrapping") == "textWrapping":
+                parts.append("\n")
+        elif child.tag in _RUN_TEXT:
+            parts.append(_RUN_TEXT[child.tag])
+    return "".join(parts)
+
+
+def _docx_run_bold(run: ElementTree.Element) -> bool:
+    """Direct bold formatting of a run (python-docx's run.bold, with None as False)."""
+    bold = run.find(f"{W_NS}rPr/{W_NS}b")
+    return bold is not None and bold.get(f"{W_NS}val", "true") in _ON_VALUES
+
+
+# Body paragraphs per chunk yielded by _iter_docx_chunks
+DOCX_CHUNK_PARAGRAPHS = 256
+
+
+def _iter_docx_chunks(source: str | bytes, profiler: Profiler = NULL_PROFILER):
+    """
+    Single-pass iterparse of word/document.xml that reproduces python-docx's
+    reading (_docx_document_chunks): body-level paragraphs only, style names
+    resolved via styles.xml, and media parts looked up only when an r:embed
+    references them. Each body element is dropped once handled, and
+    (blocks, images, frontier) is yielded every DOCX_CHUNK_PARAGRAPHS paragraphs.
+    """
+    SKIP_FORMATS = {"emf", "wmf", "tiff", "bmp"}
+    text_blocks: list[TextBlock] = []
+    all_images: list[dict] = []
+
+    with zipfile.ZipFile(_as_file(source)) as zf:
+        with profiler.stage("docx_open"):
+            doc_part = next(
+                (target for rel_type, target in _docx_rels(zf, "").values() if rel_type == OFFICE_DOCUMENT_REL),
+                None,
+            )
+            if doc_part is None:
+                raise KeyError("no officeDocument relationship")
+            rels = _docx_rels(zf, doc_part)
+            styles_part = next((t for rel_type, t in rels.values() if rel_type == STYLES_REL), None)
+            style_names, default_style = _docx_paragraph_styles(zf, styles_part)
+            content_types = ElementTree.fromstring(zf.read("[Content_Types].xml"))
+
+        media_images: dict[str, dict | None] = {}  # rId -> {ext, part}, None if not an archived image
+
+        def media_image(r_embed: str) -> dict | None:
+            if r_embed not in media_images:
+                rel_type, part = rels.get(r_embed, ("", None))
+                img = None
+                if "image" in rel_type and part is not None:
+                    ext = ext_from_content_type(_docx_content_type(content_types, part))
+                    if ext not in SKIP_FORMATS:
+                        img = {"ext": ext, "part": part}
+                        profiler.count("images_extracted")
+                        profiler.count("image_bytes_extracted", zf.getinfo(part).file_size)
+                media_images[r_embed] = img
+            return media_images[r_embed]
+
+        block_idx = 0  # acts as a virtual "y" position since docx has no coordinates
+        depth = 0
+        body = None
+        with profiler.stage("docx_paragraphs"), zf.open(doc_part) as xml:
+            for event, elem in ElementTree.iterparse(xml, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if depth == 2:
+                        body = elem
+                    continue
+                depth -= 1
+                if depth != 2:
+                    continue
+                # A direct child of w:body is complete
+                if elem.tag == f"{W_NS}p":
+                    style_id = elem.find(f"{W_NS}pPr/{W_NS}pStyle")
+                    style_id = style_id.get(f"{W_NS}val") if style_id is not None else None
+                    style_name = style_names.get(style_id, default_style)
+                    runs = elem.findall(f"{W_NS}r")
+                    text = "".join(
+                        _docx_run_text(child) if child.tag == f"{W_NS}r"
+                        else "".join(_docx_run_text(r) for r in child.findall(f"{W_NS}r"))
+                        for child in elem if child.tag in (f"{W_NS}r", f"{W_NS}hyperlink")
+                    ).strip()
+
+                    # Detect bold (entire paragraph is bold)
+                    is_bold = False
+                    if runs:
+                        is_bold = all(_docx_run_bold(run) for run in runs if _docx_run_text(run).strip())
+
+                    if text:
+                        text_blocks.append(_word_text_block(
+                            text, _word_heading_level(style_name), is_bold, block_idx,
+                        ))
+
+                    # Inline / anchored images in this paragraph's runs
+                    for run in runs:
+                        drawings = run.findall(f".//{WP_NS}inline") + run.findall(f".//{WP_NS}anchor")
+                        for drawing in drawings:
+                            blip = drawing.find(f".//{A_NS}blip")
+                            r_embed = blip.get(f"{R_NS}embed") if blip is not None else None
+                            img = media_image(r_embed) if r_embed else None
+                            if img:
+                                all_images.append({**img, "y": block_idx, "page": 0})
+                    block_idx += 1
+                    if block_idx % DOCX_CHUNK_PARAGRAPHS == 0:
+                        yield text_blocks, all_images, (0, block_idx)
+                        text_blocks, all_images = [], []
+                body.remove(elem)
+
+    yield text_blocks, all_images, (0, block_idx)
+
+
+def _docx_document_chunks(source: str | bytes, profiler: Profiler = NULL_PROFILER):
+    """
+    Read a .docx through python-docx's document model, the fallback for packages
+    the streaming parser cannot read. Yields the whole document as one chunk.
     """
     docx_mod = _check_docx()
     from docx.oxml.ns import qn
 
-    doc = docx_mod.Document(file_path)
+    with profiler.stage("docx_open"):
+        doc = docx_mod.Document(_as_file(source))
 
     # ── Extract images from the docx media ──
     # DOCX is a ZIP; images live in word/media/
     SKIP_FORMATS = {"emf", "wmf", "tiff", "bmp"}
-    media_images: dict[str, dict] = {}  # rId -> {data, ext}
-    for rel in doc.part.rels.values():
-        if "image" in rel.reltype:
-            blob = rel.target_part.blob
-            ct = rel.target_part.content_type
-            ext = ext_from_content_type(ct)
-            if ext in SKIP_FORMATS:
-                continue
-            media_images[rel.rId] = {"data": blob, "ext": ext}
+    media_images: dict[str, dict] = {}  # rId -> {ext, part}
+    with profiler.stage("docx_media"):
+        for rel in doc.part.rels.values():
+            if "image" in rel.reltype:
+                ct = rel.target_part.content_type
+                ext = ext_from_content_type(ct)
+                if ext in SKIP_FORMATS:
+                    continue
+                media_images[rel.rId] = {"ext": ext, "part": rel.target_part.partname.lstrip("/")}
+                profiler.count("images_extracted")
+                profiler.count("image_bytes_extracted", len(rel.target_part.blob))
 
     # ── Walk paragraphs to extract text blocks + inline image positions ──
-    text_blocks: list[dict] = []
+    text_blocks: list[TextBlock] = []
     all_images: list[dict] = []
     block_idx = 0  # acts as a virtual "y" position since docx has no coordinates
 
-    for para in doc.paragraphs:
-        style_name = (para.style.name or "").lower()
-        text = para.text.strip()
+    with profiler.stage("docx_paragraphs"):
+        for para in doc.paragraphs:
+            style_name = (para.style.name or "").lower()
+            text = para.text.strip()
 
-        # Detect heading level from style
-        is_heading = False
-        heading_level = 0
-        if style_name.startswith("heading"):
-            is_heading = True
-            try:
-                heading_level = int(style_name.replace("heading", "").strip())
-            except ValueError:
-                heading_level = 1
+            # Detect bold (entire paragraph is bold)
+            is_bold = False
+            if para.runs:
+                is_bold = all(run.bold for run in para.runs if run.text.strip())
 
-        # Detect bold (entire paragraph is bold)
-        is_bold = False
-        if para.runs:
-            is_bold = all(run.bold for run in para.runs if run.text.strip())
+            if text:
+                text_blocks.append(_word_text_block(text, _word_heading_level(style_name), is_bold, block_idx))
 
-        # Map heading level to a virtual font size for consistency with PDF logic
-        if is_heading:
-            size = max(24 - (heading_level - 1) * 4, 14)  # H1=24, H2=20, H3=16, H4=14
+            # Check for inline images in this paragraph
+            for run in para.runs:
+                drawing_elements = run._element.findall(f".//{qn('wp:inline')}")
+                drawing_elements += run._element.findall(f".//{qn('wp:anchor')}")
+                for drawing in drawing_elements:
+                    blip = drawing.find(f".//{qn('a:blip')}")
+                    if blip is not None:
+                        r_embed = blip.get(qn("r:embed"))
+                        if r_embed and r_embed in media_images:
+                            img = media_images[r_embed]
+                            all_images.append({"ext": img["ext"], "part": img["part"], "y": block_idx, "page": 0})
+
+            block_idx += 1
+
+    yield text_blocks, all_images, None
+
+
+# ── DOC processing (built-in Word 97-2003 reader) ──────────────────
+
+class UnsupportedDocError(ConversionError):
+    """The built-in .doc reader cannot handle this file; callers fall back to LibreOffice."""
+
+
+def _check_olefile():
+    try:
+        import olefile
+        return olefile
+    except ImportError:
+        return None
+
+
+# Operand sizes keyed by a sprm's spra bits (13-15); spra 6 is variable-length
+_SPRA_OPERAND_SIZE = {0: 1, 1: 1, 2: 2, 3: 4, 4: 2, 5: 2, 7: 3}
+
+SPRM_P_FIN_TABLE = 0x2416
+SPRM_P_ITAP = 0x6649
+SPRM_C_FBOLD = 0x0835
+SPRM_C_FSPEC = 0x0855
+SPRM_C_FDATA = 0x0806
+SPRM_C_PIC_LOCATION = 0x6A03
+
+# OfficeArt BLIP record types and the recInstance values that carry a second UID
+_BLIP_EXT = {
+    0xF01A: "emf", 0xF01B: "wmf", 0xF01C: "pict", 0xF01D: "jpg",
+    0xF01E: "png", 0xF01F: "bmp", 0xF029: "tiff", 0xF02A: "jpg",
+}
+_BLIP_TWO_UIDS = {0x3D5, 0x217, 0x543, 0x46B, 0x6E3, 0x6E1, 0x7A9, 0x6E5}
+_METAFILE_BLIPS = {0xF01A, 0xF01B, 0xF01C}
+_IMAGE_SIGNATURES = {"jpg": b"\xff\xd8", "png": b"\x89PNG"}
+
+
+def _iter_sprms(grpprl: bytes):
+    """Yield (sprm, operand) pairs from a grpprl."""
+    i = 0
+    end = len(grpprl)
+    while i + 2 <= end:
+        sprm = struct.unpack_from("<H", grpprl, i)[0]
+        i += 2
+        spra = sprm >> 13
+        if spra != 6:
+            size = _SPRA_OPERAND_SIZE[spra]
+        elif sprm == 0xD608:  # sprmTDefTable: 2-byte length, counting itself minus one
+            size = struct.unpack_from("<H", grpprl, i)[0] + 1
+        elif sprm == 0xC615 and i < end and grpprl[i] == 255:  # sprmPChgTabs, long form
+            j = i + 1
+            deleted = grpprl[j] if j < end else 0
+            j += 1 + deleted * 4
+            added = grpprl[j] if j < end else 0
+            size = j + 1 + added * 3 - i
         else:
-            size = 12  # body text
+            if i >= end:
+                return
+            size = grpprl[i]
+            i += 1
+        yield sprm, grpprl[i:i + size]
+        i += size
+
+
+def _sprm_value(grpprl: bytes, sprm: int) -> int | None:
+    """Last value of a fixed-size sprm in grpprl, as an unsigned integer."""
+    value = None
+    for code, operand in _iter_sprms(grpprl):
+        if code == sprm:
+            value = int.from_bytes(operand, "little")
+    return value
 
-        if text:
-            text_blocks.append({
-                "type": "text", "text": text, "size": size,
-                "bold": is_bold or is_heading, "y": block_idx, "page": 0,
-            })
-
-        # Check for inline images in this paragraph
-        for run in para.runs:
-            drawing_elements = run._element.findall(f".//{qn('wp:inline')}")
-            drawing_elements += run._element.findall(f".//{qn('wp:anchor')}")
-            for drawing in drawing_elements:
-                blip = drawing.find(f".//{qn('a:blip')}")
-                if blip is not None:
-                    r_embed = blip.get(qn("r:embed"))
-                    if r_embed and r_embed in media_images:
-                        img = media_images[r_embed]
-                        all_images.append({
-                            "data": img["data"], "ext": img["ext"],
-                            "y": block_idx, "page": 0,
-                        })
-
-        block_idx += 1
-
-    return text_blocks, all_images, []
+
+def _read_fkp_runs(word: bytes, table: bytes, fc: int, lcb: int, paragraph: bool) -> list[tuple[int, int, bytes]]:
+    """
+    Read a PlcBtePapx / PlcBteChpx and the FKP pages it points to.
+    Returns (fc_start, fc_end, grpprl) runs sorted by fc; PAPX grpprls start with the istd.
+    """
+    count = (lcb - 4) // 8
+    runs = []
+    for k in range(count):
+        pn = struct.unpack_from("<I", table, fc + 4 * (count + 1) + 4 * k)[0] & 0x3FFFFF
+        fkp = word[pn * 512:(pn + 1) * 512]
+        if len(fkp) < 512:
+            raise UnsupportedDocError("truncated formatting page")
+        crun = fkp[511]
+        for i in range(crun):
+            start, end = struct.unpack_from("<II", fkp, 4 * i)
+            if paragraph:
+                offset = fkp[4 * (crun + 1) + 13 * i] * 2
+                grpprl = b""
+                if offset:
+                    cb = fkp[offset]
+                    if cb:
+                        grpprl = fkp[offset + 1:offset + 2 * cb]
+                    else:
+                        grpprl = fkp[offset + 2:offset + 2 + 2 * fkp[offset + 1]]
+            else:
+                offset = fkp[4 * (crun + 1) + i] * 2
+                grpprl = fkp[offset + 1:offset + 1 + fkp[offset]] if offset else b""
+            runs.append((start, end, grpprl))
+    runs.sort(key=lambda run: run[0])
+    return runs
+
+
+def _read_styles(table: bytes, fc: int, lcb: int) -> list[tuple[int, str]]:
+    """Read the style sheet into (sti, lowercase name) per istd."""
+    if not lcb:
+        return []
+    cb_stshi = struct.unpack_from("<H", table, fc)[0]
+    cstd, cb_std_base = struct.unpack_from("<HH", table, fc + 2)
+    pos = fc + 2 + cb_stshi
+    styles = []
+    for _ in range(cstd):
+        cb_std = struct.unpack_from("<H", table, pos)[0]
+        pos += 2
+        sti, name = 0x0FFF, ""
+        if cb_std:
+            sti = struct.unpack_from("<H", table, pos)[0] & 0x0FFF
+            name_pos = pos + cb_std_base
+            if name_pos + 2 <= pos + cb_std:
+                cch = struct.unpack_from("<H", table, name_pos)[0]
+                name = table[name_pos + 2:name_pos + 2 + 2 * cch].decode("utf-16-le", "replace")
+        styles.append((sti, name.lower()))
+        pos += cb_std
+    return styles
+
+
+def _find_blip(data: bytes, start: int, end: int) -> tuple[int, int, str] | None:
+    """Find the first picture BLIP in an OfficeArt record range; returns (start, end, ext)."""
+    pos = start
+    while pos + 8 <= end:
+        ver_inst, rec_type, rec_len = struct.unpack_from("<HHI", data, pos)
+        body = pos + 8
+        body_end = min(body + rec_len, end)
+        if ver_inst & 0xF == 0xF:  # container record
+            found = _find_blip(data, body, body_end)
+            if found:
+                return found
+        elif rec_type == 0xF007:  # OfficeArtFBSE: 36-byte header, name, then the BLIP
+            if body + 36 <= body_end:
+                found = _find_blip(data, body + 36 + data[body + 33], body_end)
+                if found:
+                    return found
+        elif rec_type in _BLIP_EXT:
+            header = 16 * (2 if ver_inst >> 4 in _BLIP_TWO_UIDS else 1)
+            header += 34 if rec_type in _METAFILE_BLIPS else 1
+            return body + header, body_end, _BLIP_EXT[rec_type]
+        pos = body + rec_len
+    return None
+
+
+def _picture_location(data: bytes, offset: int) -> tuple[int, int, str] | None:
+    """Locate the BLIP of the PICF structure at offset in the Data stream."""
+    if offset + 8 > len(data):
+        return None
+    lcb, cb_header, mm = struct.unpack_from("<IHH", data, offset)
+    pos = offset + cb_header
+    if mm == 0x66:  # MM_SHAPEFILE: a picture name follows the header
+        pos += 1 + data[pos]
+    found = _find_blip(data, pos, min(offset + lcb, len(data)))
+    # Only bitmap formats the archive keeps (the same ones process_docx keeps)
+    if found and data.startswith(_IMAGE_SIGNATURES.get(found[2], b"-"), found[0]):
+        return found
+    return None
+
+
+class DocStreamLoader:
+    """
+    Pulls picture bytes out of a .doc's Data stream on demand. The stream is
+    read on first use and released with the last image record referencing it.
+    """
+
+    def __init__(self, source: str | bytes):
+        self.source = source
+        self._data = None
+
+    def load(self, offset: int, size: int, ext: str) -> tuple[bytes, str] | None:
+        if self._data is None:
+            olefile = _check_olefile()
+            with olefile.OleFileIO(_as_file(self.source)) as ole:
+                self._data = ole.openstream("Data").read()
+        return self._data[offset:offset + size], ext
+
+
+def _doc_image_attacher(source: str | bytes) -> Callable[[dict], dict | None]:
+    """Return attach(img) for PageSpool: pictures share one lazily read Data stream."""
+    loader = DocStreamLoader(source)
+
+    def attach(img: dict) -> dict:
+        img["load"] = functools.partial(loader.load, img["offset"], img["size"], img["ext"])
+        return img
+
+    return attach
+
+
+def _doc_pieces(word: bytes, clx: bytes, ccp_text: int):
+    """Yield (cp_start, text, fc, bytes_per_char) for the main-document pieces of a CLX."""
+    i = 0
+    while i < len(clx) and clx[i] == 0x01:  # skip Prc entries
+        i += 3 + struct.unpack_from("<h", clx, i + 1)[0]
+    if i >= len(clx) or clx[i] != 0x02:
+        raise UnsupportedDocError("no piece table")
+    lcb = struct.unpack_from("<I", clx, i + 1)[0]
+    plc = clx[i + 5:i + 5 + lcb]
+    count = (lcb - 4) // 12
+    cps = struct.unpack_from(f"<{count + 1}I", plc, 0)
+    for k in range(count):
+        cp_start, cp_end = cps[k], min(cps[k + 1], ccp_text)
+        if cp_start >= cp_end:
+            continue
+        fc_raw = struct.unpack_from("<I", plc, 4 * (count + 1) + 8 * k + 2)[0]
+        if fc_raw & 0x40000000:
+            fc = (fc_raw & 0x3FFFFFFF) // 2
+            raw = word[fc:fc + cp_end - cp_start]
+            yield cp_start, raw.decode("cp1252", "replace"), fc, 1
+        else:
+            fc = fc_raw & 0x3FFFFFFF
+            raw = word[fc:fc + 2 * (cp_end - cp_start)]
+            yield cp_start, raw.decode("utf-16-le", "replace"), fc, 2
+
+
+# Characters dropped from paragraph text (field marks, object anchors, ...)
+_DOC_DROP_CHARS = {chr(c) for c in range(0x20)} - {"\t", "\x0b"}
+_DOC_CHAR_MAP = {"\x0b": "\n", "\x1e": "-"}
+
+
+def process_doc(
+    source: str | bytes, cache: ExtractionCache | None = None, profiler: Profiler = NULL_PROFILER,
+) -> tuple[list[TextBlock], list[dict], list[dict]]:
+    """
+    Process a legacy Word 97-2003 .doc file without LibreOffice.
+    Returns (text_blocks, images, []) matching process_docx: body paragraphs
+    (table cells are skipped, as python-docx's doc.paragraphs does), heading
+    levels from built-in or "Heading N" styles, bold from direct formatting,
+    and inline JPEG/PNG pictures. Floating drawings are not read.
+    Raises UnsupportedDocError for files it cannot read (encrypted, pre-Word 97,
+    missing olefile, malformed structures).
+    """
+    return _collect_spool(extract_document(source, cache=cache, profiler=profiler, kind="doc"))
+
+
+def _iter_doc_chunks(source: str | bytes, profiler: Profiler = NULL_PROFILER):
+    """Yield a .doc as one (blocks, images, frontier) chunk; see process_doc."""
+    olefile = _check_olefile()
+    if olefile is None:
+        raise UnsupportedDocError("olefile is not installed")
+
+    with profiler.stage("doc_parse"):
+        try:
+            text_blocks, images, floating = _parse_doc(olefile, source)
+        except UnsupportedDocError:
+            raise
+        except Exception as e:
+            raise UnsupportedDocError(f"unreadable structure: {e}") from e
+    if floating:
+        log.info(f"Note: {floating} floating drawing(s) skipped; use --libreoffice to include them.")
+    yield text_blocks, images, None
+
+
+def _parse_doc(olefile, source: str | bytes) -> tuple[list[TextBlock], list[dict], int]:
+    """Parse a .doc into text blocks, image references and a count of floating drawings."""
+    # olefile would take short bytes for a file name
+    source = _as_file(source)
+    if not olefile.isOleFile(source):
+        raise UnsupportedDocError("not an OLE compound file")
+    with olefile.OleFileIO(source) as ole:
+        word = ole.openstream("WordDocument").read()
+        ident, n_fib = struct.unpack_from("<HH", word, 0)
+        flags = struct.unpack_from("<H", word, 0x0A)[0]
+        if ident != 0xA5EC or n_fib < 0x00C1:
+            raise UnsupportedDocError("not a Word 97 or later document")
+        if flags & 0x0100 or flags & 0x8000:
+            raise UnsupportedDocError("document is encrypted")
+        table_name = "1Table" if flags & 0x0200 else "0Table"
+        if not ole.exists(table_name):
+            raise UnsupportedDocError(f"missing {table_name} stream")
+        table = ole.openstream(table_name).read()
+        data = ole.openstream("Data").read() if ole.exists("Data") else b""
+
+    # FIB: FibBase (32 bytes), then fibRgW, fibRgLw and fibRgFcLcb, each length-prefixed
+    pos = 32
+    csw = struct.unpack_from("<H", word, pos)[0]
+    pos += 2 + 2 * csw
+    cslw = struct.unpack_from("<H", word, pos)[0]
+    ccp_text = struct.unpack_from("<i", word, pos + 2 + 4 * 3)[0]
+    pos += 2 + 4 * cslw
+    fc_lcb = pos + 2
+
+    def fib_pair(index: int) -> tuple[int, int]:
+        return struct.unpack_from("<II", word, fc_lcb + 8 * index)
+
+    fc_stsh, lcb_stsh = fib_pair(1)
+    fc_chpx, lcb_chpx = fib_pair(12)
+    fc_papx, lcb_papx = fib_pair(13)
+    fc_clx, lcb_clx = fib_pair(33)
+
+    styles = _read_styles(table, fc_stsh, lcb_stsh)
+    papx_runs = _read_fkp_runs(word, table, fc_papx, lcb_papx, paragraph=True)
+    chpx_runs = _read_fkp_runs(word, table, fc_chpx, lcb_chpx, paragraph=False)
+    papx_starts = [run[0] for run in papx_runs]
+    chpx_starts = [run[0] for run in chpx_runs]
+
+    def run_at(runs, starts, fc) -> bytes:
+        i = bisect.bisect_right(starts, fc) - 1
+        if i >= 0 and runs[i][0] <= fc < runs[i][1]:
+            return runs[i][2]
+        return b""
+
+    text_blocks: list[TextBlock] = []
+    images: list[dict] = []
+    floating = 0
+    block_idx = 0  # virtual "y", counting body paragraphs like process_docx
+
+    parts: list[str] = []
+    run_bold: list[bool] = []  # bold flag of every run with visible text
+    para_images: list[tuple[int, int, str]] = []
+    fields: list[bool] = []  # per open field: True once past its separator (showing the result)
+
+    for _, text, fc, bpc in _doc_pieces(word, table[fc_clx:fc_clx + lcb_clx], ccp_text):
+        i = 0
+        while i < len(text):
+            # Split the piece at character-run boundaries so each span has one CHPX
+            char_fc = fc + i * bpc
+            k = bisect.bisect_right(chpx_starts, char_fc) - 1
+            span_end = len(text)
+            if 0 <= k < len(chpx_runs) and char_fc < chpx_runs[k][1]:
+                span_end = min(span_end, i + (chpx_runs[k][1] - char_fc + bpc - 1) // bpc)
+            elif k + 1 < len(chpx_runs):
+                span_end = min(span_end, i + max(1, (chpx_runs[k + 1][0] - char_fc) // bpc))
+            chpx = run_at(chpx_runs, chpx_starts, char_fc)
+            bold = _sprm_value(chpx, SPRM_C_FBOLD) in (1, 0x81)
+            visible: list[str] = []
+
+            for j in range(i, span_end):
+                ch = text[j]
+                if ch == "\x13":
+                    fields.append(False)
+                elif ch == "\x14":
+                    if fields:
+                        fields[-1] = True
+                elif ch == "\x15":
+                    if fields:
+                        fields.pop()
+                elif ch in ("\r", "\x07"):
+                    # Paragraph (or table cell) end: flush
+                    if visible:
+                        parts.extend(visible)
+                        run_bold.append(bold)
+                        visible = []
+                    papx = run_at(papx_runs, papx_starts, fc + j * bpc)
+                    in_table = ch == "\x07" or _sprm_value(papx, SPRM_P_FIN_TABLE) or _sprm_value(papx, SPRM_P_ITAP)
+                    if not in_table:
+                        istd = struct.unpack_from("<H", papx, 0)[0] if len(papx) >= 2 else 0
+                        sti, name = styles[istd] if istd < len(styles) else (0x0FFF, "")
+                        _emit_doc_paragraph(
+                            text_blocks, images, "".join(parts), sti, name,
+                            run_bold, para_images, block_idx,
+                        )
+                        block_idx += 1
+                    parts, run_bold, para_images = [], [], []
+                elif all(fields):
+                    if ch == "\x01" and _sprm_value(chpx, SPRM_C_FSPEC) and not _sprm_value(chpx, SPRM_C_FDATA):
+                        location = _sprm_value(chpx, SPRM_C_PIC_LOCATION)
+                        found = _picture_location(data, location) if location is not None else None
+                        if found:
+                            para_images.append(found)
+                    elif ch == "\x08":
+                        floating += 1
+                    elif ch not in _DOC_DROP_CHARS:
+                        visible.append(_DOC_CHAR_MAP.get(ch, ch))
+
+            if visible:
+                text_run = "".join(visible)
+                parts.append(text_run)
+                if text_run.strip():
+                    run_bold.append(bold)
+            i = span_end
+
+    return text_blocks, images, floating
+
+
+def _emit_doc_paragraph(
+    text_blocks: list[TextBlock], images: list[dict], raw_text: str, sti: int, name: str,
+    run_bold: list[bool], para_images: list[tuple[int, int, str]], block_idx: int,
+) -> None:
+    """Append one body paragraph, mapped the same way process_docx maps a docx paragraph."""
+    text = raw_text.strip()
+    # Built-in "heading 1".."heading 9" by identifier, so localized names still match
+    heading_level = sti if 1 <= sti <= 9 else _word_heading_level(name)
+    if text:
+        text_blocks.append(_word_text_block(text, heading_level, bool(run_bold) and all(run_bold), block_idx))
+    for start, end, ext in para_images:
+        images.append({"offset": start, "size": end - start, "ext": ext, "y": block_idx, "page": 0})
+
+
+# ── Page spool: extraction output streamed through disk ─────────────
+
+def _read_last_line(f) -> bytes:
+    """Return the last line of a binary file without reading the rest."""
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    data = b""
+    while pos > 0:
+        step = min(1 << 16, pos)
+        pos -= step
+        f.seek(pos)
+        data = f.read(step) + data
+        newline = data.rfind(b"\n", 0, len(data) - 1)
+        if newline != -1:
+            return data[newline + 1:]
+    return data
+
+
+class PageSpool:
+    """
+    Extracted pages written once as JSON lines and replayed in order, so the
+    structure pass streams the document from disk instead of holding it in
+    memory. Each line is one (blocks, images, frontier) chunk; the last line
+    holds the block font-size counts heading detection needs up front.
+    Spools written into the extraction cache are its whole-document entries.
+    Images are stored as references; attach(img) turns each one back into a
+    loadable record on replay, or returns None to drop it.
+    """
+
+    def __init__(self, f, attach: Callable[[dict], dict | None], temp_path: str | None = None):
+        self._f = f
+        self._attach = attach
+        self._temp_path = temp_path
+        stats = json.loads(_read_last_line(f))
+        # Rebuilt in first-seen order so most_common() breaks ties as it would in one pass
+        self.sizes = Counter(dict(stats["sizes"]))
+        self.block_count = stats["blocks"]
+
+    @staticmethod
+    def _dump(f, chunks) -> None:
+        """Write chunks as JSON lines followed by the statistics line."""
+        sizes: Counter = Counter()
+        block_count = 0
+        for blocks, images, frontier in chunks:
+            sizes.update(_block_sizes(blocks))
+            block_count += len(blocks)
+            line = json.dumps([blocks, images, frontier], ensure_ascii=False, separators=(",", ":"))
+            f.write(line.encode("utf-8") + b"\n")
+        f.write(json.dumps({"sizes": list(sizes.items()), "blocks": block_count}).encode() + b"\n")
+
+    @classmethod
+    def write(
+        cls, chunks, attach: Callable[[dict], dict | None], path: str | None = None,
+        in_memory: bool = False,
+    ) -> "PageSpool":
+        """
+        Spool an iterable of chunks to path (e.g. a cache entry, replaced
+        atomically once complete) or, without one, to a temporary file that
+        close() removes. in_memory keeps an uncached spool in a buffer instead
+        of a temporary file.
+        """
+        if in_memory and not path:
+            f = io.BytesIO()
+            cls._dump(f, chunks)
+            return cls(f, attach)
+
+        fd = None
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            except OSError:
+                path = None  # Caching is best effort
+        if fd is None:
+            fd, tmp_path = tempfile.mkstemp(prefix="d2a_spool_", suffix=".jsonl")
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                cls._dump(f, chunks)
+            if path:
+                try:
+                    os.replace(tmp_path, path)
+                    tmp_path = None
+                except OSError:
+                    path = None
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return cls(open(path or tmp_path, "rb"), attach, temp_path=tmp_path)
+
+    @classmethod
+    def open(cls, path: str, attach: Callable[[dict], dict | None]) -> "PageSpool | None":
+        """Open a spool written earlier (a cache entry), or None if it is missing or incomplete."""
+        try:
+            f = open(path, "rb")
+        except OSError:
+            return None
+        try:
+            spool = cls(f, attach)
+            os.utime(path)
+        except (OSError, ValueError, KeyError, TypeError):
+            f.close()
+            return None
+        return spool
+
+    def heading_threshold(self) -> float:
+        return _heading_threshold(self.sizes)
+
+    def __iter__(self):
+        """Yield (blocks, images, frontier) per chunk, images passed through attach."""
+        self._f.seek(0)
+        for line in self._f:
+            row = json.loads(line)
+            if isinstance(row, dict):  # statistics line
+                break
+            blocks, images, frontier = row
+            yield (
+                [TextBlock(*b) for b in blocks],
+                [img for img in map(self._attach, images) if img is not None],
+                tuple(frontier) if frontier else None,
+            )
+
+    def close(self) -> None:
+        self._f.close()
+        if self._temp_path:
+            with contextlib.suppress(OSError):
+                os.remove(self._temp_path)
+            self._temp_path = None
+
+    def __enter__(self) -> "PageSpool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class PageStream:
+    """
+    PageSpool stand-in for when the heading threshold is known before
+    extraction (sampled): chunks go straight from the extractor to the
+    structure pass, with nothing spooled or cached as a whole document.
+    Extraction runs as the stream is consumed.
+    """
+
+    def __init__(self, chunks, attach: Callable[[dict], dict | None], heading_threshold: float):
+        self._chunks = chunks
+        self._attach = attach
+        self._heading_threshold = heading_threshold
+
+    def heading_threshold(self) -> float:
+        return self._heading_threshold
+
+    def __iter__(self):
+        for blocks, images, frontier in self._chunks:
+            yield blocks, [img for img in map(self._attach, images) if img is not None], frontier
+
+    def close(self) -> None:
+        self._chunks.close()
+
+    def __enter__(self) -> "PageStream":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def extract_document(
+    source: str | bytes, workers: int = 1, cache: ExtractionCache | None = None,
+    profiler: Profiler = NULL_PROFILER, page_ranges: tuple | None = None,
+    heading_threshold: float | None = None, kind: str | None = None, in_memory: bool = False,
+    budget: PageBudget | None = None, fast_text: bool = False,
+) -> PageSpool | PageStream:
+    """
+    Extract a .pdf, .docx or .doc file (a path, or bytes with kind) into a
+    PageSpool, replayed from the cache when the file is unchanged. Given a PDF
+    heading_threshold, returns a PageStream instead, with no first pass.
+    Raises UnsupportedDocError for .doc files the built-in reader cannot handle.
+    """
+    if kind is None:
+        if not isinstance(source, str):
+            raise ValueError("kind is required when source is bytes")
+        kind = os.path.splitext(source)[1].lower().lstrip(".")
+    if kind == "pdf":
+        attach = _pdf_image_attacher(source, profiler)
+    elif kind == "doc":
+        attach = _doc_image_attacher(source)
+    else:
+        attach = _docx_image_attacher(source)
+
+    if kind == "pdf" and heading_threshold is not None:
+        cache_dir = cache.cache_dir if cache else None
+        chunks = _iter_pdf_chunks(source, workers, cache_dir, profiler, page_ranges, budget, fast_text)
+        return PageStream(chunks, attach, heading_threshold)
+
+    spool_path = None
+    if cache:
+        # Page selections only narrow PDFs, and the full document keeps its old key
+        selection = (page_ranges,) if kind == "pdf" and page_ranges else ()
+        if kind == "pdf" and fast_text:
+            selection += ("fast",)
+        with profiler.stage("cache_lookup"):
+            spool_path = cache.spool_path(cache.key(kind, file_sha256(source), *selection))
+            spool = PageSpool.open(spool_path, attach)
+        if spool is not None:
+            profiler.count("cache_file_hits")
+            return spool
+
+    if kind == "pdf" and budget is not None:
+        spool_path = None  # pages may be degraded, so the result is not cached
+    spool_chunks = functools.partial(PageSpool.write, attach=attach, path=spool_path, in_memory=in_memory)
+    if kind == "pdf":
+        cache_dir = cache.cache_dir if cache else None
+        return spool_chunks(_iter_pdf_chunks(
+            source, workers, cache_dir, profiler, page_ranges, budget, fast_text,
+        ))
+    if kind == "doc":
+        return spool_chunks(_iter_doc_chunks(source, profiler))
+    try:
+        return spool_chunks(_iter_docx_chunks(source, profiler))
+    except (KeyError, ElementTree.ParseError, zipfile.BadZipFile) as e:
+        log.info(f"Note: streaming DOCX parser failed ({e}); falling back to python-docx")
+    try:
+        return spool_chunks(_docx_document_chunks(source, profiler))
+    except (KeyError, ElementTree.ParseError, zipfile.BadZipFile) as e:
+        raise ConversionError(f"Cannot read Word document: {e}") from e
+
+
+def _collect_spool(spool: PageSpool) -> tuple[list[TextBlock], list[dict], list[dict]]:
+    """Read a whole spool back into (text_blocks, images, [])."""
+    all_blocks: list[TextBlock] = []
+    all_images: list[dict] = []
+    with spool:
+        for blocks, images, _ in spool:
+            all_blocks.extend(blocks)
+            all_images.extend(images)
+    return all_blocks, all_images, []
 
 
 # ── Shared: build categories & items from text blocks ────────────────
 
+def _image_payload(img: dict) -> tuple[bytes, str] | None:
+    """Return (data, ext) for an image record, extracting lazily if needed."""
+    if "load" in img:
+        return img["load"]()
+    return img["data"], img["ext"]
+
+
+def _image_item_distance(item_page: int, item_y: float, img_page: int, img_y: float) -> float:
+    """Distance used to associate an image with a content item."""
+    if item_page == img_page:
+        return abs(item_y - img_y)
+    return abs(item_page - img_page) * 10000 + abs(item_y - img_y)
+
+
+def _nearest_item(index: tuple, img_page: int, img_y: float) -> int:
+    """
+    Return the index of the item closest to an image under _image_item_distance,
+    breaking ties by lowest item index (same result as a linear scan).
+    """
+    pages, columns = index
+    best_dist = float("inf")
+    best_idx = 0
+
+    def scan_page(page: int) -> None:
+        nonlocal best_dist, best_idx
+        ys, idxs = columns[page]
+        pos = bisect.bisect_left(ys, img_y)
+
+        def dist(j: int) -> float:
+            return _image_item_distance(page, ys[j], img_page, img_y)
+
+        nearest = min(dist(j) for j in (pos - 1, pos) if 0 <= j < len(ys))
+        # Distance never decreases moving away from pos, so all items at the
+        # minimum form one contiguous run around it
+        lo, hi = pos, pos
+        while lo > 0 and dist(lo - 1) == nearest:
+            lo -= 1
+        while hi < len(ys) and dist(hi) == nearest:
+            hi += 1
+        page_idx = min(idxs[lo:hi])
+        if (nearest, page_idx) < (best_dist, best_idx):
+            best_dist, best_idx = nearest, page_idx
+
+    # Walk outward from the image's page; a page |dp| away costs at least |dp| * 10000
+    start = bisect.bisect_left(pages, img_page)
+    for k in range(start, len(pages)):
+        if abs(pages[k] - img_page) * 10000 > best_dist:
+            break
+        scan_page(pages[k])
+    for k in range(start - 1, -1, -1):
+        if abs(pages[k] - img_page) * 10000 > best_dist:
+            break
+        scan_page(pages[k])
+    return best_idx
+
+
 def build_structure(
-    all_blocks: list[dict],
+    all_blocks: list[TextBlock],
     all_images: list[dict],
     args: argparse.Namespace,
     file_path: str,
-) -> tuple[dict, dict[str, bytes]]:
+    write_image: Callable[[str, bytes], None],
+) -> tuple[dict, list[str]]:
     """
-    Convert text blocks + images into a ProjectArchive dict and image file map.
+    Convert text blocks + images into a ProjectArchive dict in one go.
+    Whole-document wrapper around StructureBuilder. Returns (project, image_paths).
     """
-    if not all_blocks:
-        print("Warning: No text content found in document.")
+    builder = StructureBuilder(args, _detect_heading_threshold(all_blocks), write_image)
+    builder.add_page(all_blocks, all_images)
+    return builder.finish(file_path)
 
-    # Determine heading threshold
-    heading_threshold = _detect_heading_threshold(all_blocks)
 
-    # Build categories and items
-    categories: list[dict] = []
-    current_category: dict | None = None
-    current_item: dict | None = None
+class StructureBuilder:
+    """
+    Builds a ProjectArchive dict from chunks of text blocks + images fed in
+    document order. Categories and items are emitted as their headings arrive
+    and an item's paragraphs are joined as soon as it closes. Images carry
+    either data/ext or a lazy load() returning (data, ext), and optionally a
+    key naming their source image within the document; an image is placed
+    on its nearest item once the chunk frontier rules out any nearer item
+    still to come, and always in arrival order, so the result matches a
+    whole-document pass. Bytes are only pulled for images that win an item
+    slot and whose key was not written yet; identical image content is
+    written once per document (later items share the first copy's path), and
+    each kept image goes to
+    write_image(zip_path, data) straight away.
+    """
 
-    for block in all_blocks:
-        is_heading = block["size"] >= heading_threshold or (
-            block["bold"] and len(block["text"]) < 100
+    def __init__(self, args: argparse.Namespace, heading_threshold: float,
+                 write_image: Callable[[str, bytes], None]):
+        self.args = args
+        self.heading_threshold = heading_threshold
+        self.write_image = write_image
+        self.content_items: list[dict] = []
+        self.image_paths: list[str] = []
+        self.block_count = 0
+        self.image_count = 0
+        self._category_count = 0
+        self._category: dict | None = None  # content item of the open category
+        self._category_has_items = False
+        self._item: dict | None = None  # content item of the open item
+        self._paragraphs: list[str] = []  # the open item's text, joined when it closes
+        self._orphans: list[str] | None = []  # text before the first heading, for the fallback
+        # Items in flat order, plus a per-page index of (y, item index) for _nearest_item
+        self._items: list[dict] = []
+        self._item_pos: list[tuple[int, float]] = []
+        self._pages: list[int] = []
+        self._columns: dict[int, tuple[list[float], list[int]]] = {}
+        self._pending: deque[dict] = deque()
+        self._claimed: set[int] = set()
+        self._written_paths: dict[str, str] = {}  # image sha256 -> its path in the archive
+        self._written_keys: dict = {}  # image key -> its path in the archive
+
+    def add_page(self, blocks: list[TextBlock], images: list[dict],
+                 frontier: tuple[int, float | None] | None = None) -> None:
+        """
+        Add the next chunk; frontier is where blocks of later chunks can start:
+        (page, None) after a whole page, (page, y) within one, None if unknown.
+        """
+        for block in blocks:
+            self._add_block(block)
+        self.block_count += len(blocks)
+        self.image_count += len(images)
+        self._pending.extend(images)
+        if frontier is not None:
+            self._place_images(frontier)
+
+    def finish(self, file_path: str) -> tuple[dict, list[str]]:
+        """Close the last item, place the remaining images and return (project, image_paths)."""
+        if not self.block_count:
+            log.warning("Warning: No text content found in document.")
+        self._close_item()
+
+        # Fallback: single default category
+        if not self._category_count:
+            paragraphs = self._orphans
+            self._open_category("default", 0, 0)
+            self._open_item(self.args.name or "Content", 0, 0, paragraphs)
+            self._close_item()
+        self._place_images(None)
+
+        is_grouped = self.args.grouped if self.args.grouped is not None else self._category_count > 1
+        project = {
+            "version": 1,
+            "exportedAt": datetime.now(timezone.utc).isoformat(),
+            "card": {
+                "name": self.args.name or os.path.splitext(os.path.basename(file_path))[0],
+                "description": "",
+                "original_language": self.args.language,
+                "content_mode": self.args.mode,
+                "is_grouped": is_grouped,
+                "group_display": "expanded",
+                "billing_type": "digital",
+                "default_daily_session_limit": None,
+                "conversation_ai_enabled": False,
+                "ai_instruction": "",
+                "ai_knowledge_base": "",
+                "ai_welcome_general": "",
+                "ai_welcome_item": "",
+                "qr_code_position": "BR",
+                "image": None,
+                "crop_parameters": None,
+                "translations": None,
+                "content_hash": None,
+            },
+            "contentItems": self.content_items,
+        }
+        return project, self.image_paths
+
+    # ── Categories & items ──
+
+    def _add_block(self, block: TextBlock) -> None:
+        is_heading = block.size >= self.heading_threshold or (
+            block.bold and len(block.text) < 100
         )
 
         if is_heading:
-            text = block["text"].strip()
-            if current_category is None or block["size"] >= heading_threshold:
-                current_category = {
-                    "name": text, "items": [],
-                    "page": block["page"], "y": block["y"],
-                }
-                categories.append(current_category)
-                current_item = None
+            text = block.text.strip()
+            if self._category is None or block.size >= self.heading_threshold:
+                self._close_item()
+                self._open_category(text, block.page, block.y)
             else:
-                current_item = {
-                    "name": text, "content": "",
-                    "page": block["page"], "y": block["y"],
-                }
-                current_category["items"].append(current_item)
-        else:
-            if current_item:
-                if current_item["content"]:
-                    current_item["content"] += "\n\n"
-                current_item["content"] += block["text"]
-            elif current_category and not current_category["items"]:
-                current_item = {
-                    "name": current_category["name"],
-                    "content": block["text"],
-                    "page": block["page"], "y": block["y"],
-                }
-                current_category["items"].append(current_item)
-
-    # Fallback: single default category
-    if not categories:
-        categories = [{
-            "name": "default",
-            "items": [{
-                "name": args.name or "Content",
-                "content": "\n\n".join(b["text"] for b in all_blocks),
-                "page": 0, "y": 0,
-            }],
-            "page": 0, "y": 0,
-        }]
-
-    is_grouped = args.grouped if args.grouped is not None else len(categories) > 1
-
-    # Associate images with nearest content item
-    image_files: dict[str, bytes] = {}
-    item_images: dict[int, str] = {}
-
-    flat_items: list[dict] = []
-    for cat in categories:
-        for item in cat["items"]:
-            flat_items.append(item)
-
-    for img in all_images:
-        best_idx = 0
-        best_dist = float("inf")
-        for i, item in enumerate(flat_items):
-            if item["page"] == img["page"]:
-                dist = abs(item["y"] - img["y"])
-            else:
-                dist = abs(item["page"] - img["page"]) * 10000 + abs(item["y"] - img["y"])
-            if dist < best_dist:
-                best_dist = dist
-                best_idx = i
-
-        if best_idx not in item_images:
-            item_name = sanitize_filename(flat_items[best_idx]["name"])
-            ext = img["ext"] if img["ext"] in ("jpg", "jpeg", "png", "webp", "gif") else "jpg"
-            filename = f"{best_idx}-{item_name}.{ext}"
-            zip_path = f"images/content/{filename}"
-            image_files[zip_path] = img["data"]
-            item_images[best_idx] = zip_path
-
-    # Build project.json
-    content_items = []
-    item_idx = 0
-    for cat in categories:
-        content_items.append({
-            "name": cat["name"], "content": "", "ai_knowledge_base": "",
-            "sort_order": len(content_items), "parent_name": None,
+                self._open_item(text, block.page, block.y, [])
+        elif self._item is not None:
+            self._paragraphs.append(block.text)
+        elif self._category is not None and not self._category_has_items:
+            self._open_item(self._category["name"], block.page, block.y, [block.text])
+        elif self._orphans is not None:
+            self._orphans.append(block.text)
+
+    def _open_category(self, name: str, page: int, y: float) -> None:
+        self._category = {
+            "name": name, "content": "", "ai_knowledge_base": "",
+            "sort_order": len(self.content_items), "parent_name": None,
             "image": None, "crop_parameters": None,
             "translations": None, "content_hash": None,
-        })
-        for item in cat["items"]:
-            content_items.append({
-                "name": item["name"], "content": item["content"],
-                "ai_knowledge_base": "", "sort_order": len(content_items),
-                "parent_name": cat["name"],
-                "image": item_images.get(item_idx),
-                "crop_parameters": None, "translations": None, "content_hash": None,
-            })
-            item_idx += 1
-
-    project = {
-        "version": 1,
-        "exportedAt": datetime.now(timezone.utc).isoformat(),
-        "card": {
-            "name": args.name or os.path.splitext(os.path.basename(file_path))[0],
-            "description": "",
-            "original_language": args.language,
-            "content_mode": args.mode,
-            "is_grouped": is_grouped,
-            "group_display": "expanded",
-            "billing_type": "digital",
-            "default_daily_session_limit": None,
-            "conversation_ai_enabled": False,
-            "ai_instruction": "",
-            "ai_knowledge_base": "",
-            "ai_welcome_general": "",
-            "ai_welcome_item": "",
-            "qr_code_position": "BR",
+        }
+        self.content_items.append(self._category)
+        self._category_count += 1
+        self._category_has_items = False
+        self._item = None
+        self._orphans = None
+
+    def _open_item(self, name: str, page: int, y: float, paragraphs: list[str]) -> None:
+        self._close_item()
+        self._item = {
+            "name": name, "content": "",
+            "ai_knowledge_base": "", "sort_order": len(self.content_items),
+            "parent_name": self._category["name"],
             "image": None,
-            "crop_parameters": None,
-            "translations": None,
-            "content_hash": None,
-        },
-        "contentItems": content_items,
-    }
+            "crop_parameters": None, "translations": None, "content_hash": None,
+        }
+        self.content_items.append(self._item)
+        self._category_has_items = True
+        self._paragraphs = paragraphs
+
+        idx = len(self._items)
+        self._items.append(self._item)
+        self._item_pos.append((page, y))
+        if page not in self._columns:
+            bisect.insort(self._pages, page)
+            self._columns[page] = ([], [])
+        ys, idxs = self._columns[page]
+        # idx is the largest index so far, so it goes after any equal y
+        pos = bisect.bisect_right(ys, y)
+        ys.insert(pos, y)
+        idxs.insert(pos, idx)
+
+    def _close_item(self) -> None:
+        if self._item is not None:
+            self._item["content"] = "\n\n".join(self._paragraphs)
+            self._paragraphs = []
+
+    # ── Images ──
+
+    def _place_images(self, frontier: tuple[int, float | None] | None) -> None:
+        """Place pending images in order while their nearest item is final (all of them if frontier is None)."""
+        while self._pending:
+            img = self._pending[0]
+            best_idx = None
+            if self._items:
+                best_idx = _nearest_item((self._pages, self._columns), img["page"], img["y"])
+                if frontier is not None and not self._is_final(best_idx, img, frontier):
+                    return
+            elif frontier is not None:
+                return
+            self._pending.popleft()
+            self._place(img, best_idx)
+
+    def _is_final(self, best_idx: int, img: dict, frontier: tuple[int, float | None]) -> bool:
+        """True if no item at or after frontier can be nearer than best_idx (ties go to the lower index)."""
+        item_page, item_y = self._item_pos[best_idx]
+        best = _image_item_distance(item_page, item_y, img["page"], img["y"])
+        front_page, front_y = frontier
+        if front_page > img["page"]:
+            bound = (front_page - img["page"]) * 10000
+        elif front_page == img["page"] and front_y is not None:
+            bound = max(0.0, front_y - img["y"])
+        else:
+            bound = 0.0
+        return best <= bound
+
+    def _place(self, img: dict, best_idx: int | None) -> None:
+        if best_idx is not None and best_idx not in self._claimed:
+            key = img.get("key")
+            # A repeat of an image already written shares its file without being decoded again
+            zip_path = self._written_keys.get(key) if key is not None else None
+            if zip_path is None:
+                zip_path = self._write_payload(img, best_idx)
+                if zip_path is not None and key is not None:
+                    self._written_keys[key] = zip_path
+            if zip_path is not None:
+                self._items[best_idx]["image"] = zip_path
+                self._claimed.add(best_idx)
+        # Release the payload whether or not this image was kept
+        img.pop("data", None)
+        img.pop("load", None)
+
+    def _write_payload(self, img: dict, best_idx: int) -> str | None:
+        """Write img's bytes for item best_idx and return its zip path (None if it has no bytes)."""
+        payload = _image_payload(img)
+        if not payload:
+            return None
+        data, img_ext = payload
+        digest = hashlib.sha256(data).hexdigest()
+        # Identical bytes are stored once; later items share the first one's file
+        zip_path = self._written_paths.get(digest)
+        if zip_path is None:
+            item_name = sanitize_filename(self._items[best_idx]["name"])
+            ext = img_ext if img_ext in ("jpg", "jpeg", "png", "webp", "gif") else "jpg"
+            zip_path = f"images/content/{best_idx}-{item_name}.{ext}"
+            self.write_image(zip_path, data)
+            self.image_paths.append(zip_path)
+            self._written_paths[digest] = zip_path
+        return zip_path
+
+
+# ── Image normalization ──────────────────────────────────────────────
+
+def _check_pillow():
+    try:
+        from PIL import Image
+        return Image
+    except ImportError:
+        raise ConversionError("Pillow is required for --normalize-images. Install with:\n"
+                              "  pip install pillow") from None
+
+
+PIL_FORMAT_EXT = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+
+
+def _encode_image(im, fmt: str, quality: int) -> bytes:
+    """Encode a Pillow image as WEBP or JPEG."""
+    from PIL import Image
+    if fmt == "JPEG" and im.mode in ("RGBA", "LA"):
+        background = Image.new("RGB", im.size, (255, 255, 255))
+        background.paste(im, mask=im.getchannel("A"))
+        im = background
+    buf = io.BytesIO()
+    if fmt == "JPEG":
+        im.convert("RGB").save(buf, format="JPEG", quality=quality, optimize=True, progressive=True)
+    else:
+        im.save(buf, format="WEBP", quality=quality, method=4)
+    return buf.getvalue()
+
+
+def _normalize_image(
+    data: bytes, max_dim: int, fmt: str, quality: int, thumb_dim: int,
+) -> tuple[bytes, str, bytes | None] | None:
+    """
+    Downscale and re-encode one image (runs in a worker process).
+    Returns (data, ext, thumbnail) or None if Pillow cannot decode it. The
+    original bytes are kept when they are already a web format, need no
+    resizing and are smaller than the re-encoded version.
+    """
+    from PIL import Image
+    try:
+        with Image.open(io.BytesIO(data)) as src:
+            if getattr(src, "n_frames", 1) > 1:
+                return None  # leave animations untouched
+            src_format = src.format
+            im = src.convert("RGBA" if "A" in src.mode or "transparency" in src.info else "RGB")
+    except Exception:
+        return None
+
+    original_size = im.size
+    im.thumbnail((max_dim, max_dim), Image.LANCZOS)
+    out = _encode_image(im, fmt, quality)
+    ext = "webp" if fmt == "WEBP" else "jpg"
+    if im.size == original_size and src_format in PIL_FORMAT_EXT and len(data) <= len(out):
+        out, ext = data, PIL_FORMAT_EXT[src_format]
+
+    thumb = None
+    if thumb_dim:
+        im.thumbnail((thumb_dim, thumb_dim), Image.LANCZOS)
+        thumb = _encode_image(im, fmt, quality)
+    return out, ext, thumb
+
+
+class ImageNormalizer:
+    """
+    Writer stage that downscales and re-encodes images in a worker pool before
+    handing them to an ArchiveWriter. At most a few images per worker are in
+    flight, so memory stays bounded. Renamed paths (e.g. .png -> .webp) are
+    patched into project.json by finish(). Thumbnails, when enabled, are written
+    under images/thumbnails/ with the same file name.
+    """
 
-    return project, image_files
+    def __init__(
+        self, writer: "ArchiveWriter", max_dim: int = 2048, fmt: str = "webp",
+        quality: int = 85, thumb_dim: int = 0, workers: int = 1,
+    ):
+        from concurrent.futures import ProcessPoolExecutor
+        _check_pillow()
+        self.writer = writer
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.image_count = 0
+        self._job = functools.partial(
+            _normalize_image, max_dim=max_dim, fmt="JPEG" if fmt == "jpeg" else "WEBP",
+            quality=quality, thumb_dim=thumb_dim,
+        )
+        self._encoded_ext = "jpg" if fmt == "jpeg" else "webp"
+        self._pool = ProcessPoolExecutor(max_workers=max(1, workers))
+        self._max_pending = max(1, workers) * 2
+        self._pending: deque = deque()
+        self._renamed: dict[str, str] = {}
+
+    def add_image(self, zip_path: str, data: bytes) -> None:
+        self._pending.append((zip_path, data, self._pool.submit(self._job, data)))
+        while len(self._pending) > self._max_pending:
+            self._write_next()
+
+    def _write_next(self) -> None:
+        zip_path, data, future = self._pending.popleft()
+        self.image_count += 1
+        self.bytes_in += len(data)
+        result = future.result()
+        if result is None:
+            self.bytes_out += len(data)
+            self.writer.add_image(zip_path, data)
+            return
+        out, ext, thumb = result
+        final_path = f"{os.path.splitext(zip_path)[0]}.{ext}"
+        self.bytes_out += len(out)
+        self.writer.add_image(final_path, out)
+        if thumb is not None:
+            thumb_name = os.path.basename(os.path.splitext(zip_path)[0])
+            self.writer.add_image(f"images/thumbnails/{thumb_name}.{self._encoded_ext}", thumb)
+        if final_path != zip_path:
+            self._renamed[zip_path] = final_path
+
+    def finish(self, project: dict) -> None:
+        while self._pending:
+            self._write_next()
+        for ci in project["contentItems"]:
+            if ci.get("image") in self._renamed:
+                ci["image"] = self._renamed[ci["image"]]
+        self.writer.finish(project)
+
+    def __enter__(self) -> "ImageNormalizer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._pool.shutdown(wait=exc_type is None, cancel_futures=exc_type is not None)
 
 
 # ── ZIP creation ─────────────────────────────────────────────────────
 
-def create_zip(project: dict, image_files: dict[str, bytes], output_path: str) -> None:
-    """Package project.json and images into a ZIP archive."""
-    with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr("project.json", json.dumps(project, indent=2, ensure_ascii=False))
+def _project_json_chunks(project: dict, compact: bool = False):
+    """
+    Yield project.json text one content item at a time. The result is
+    identical to json.dumps(project) with indent=2 (or compact separators),
+    but each item goes through the encoder on its own, so the whole document
+    is never one string and the compact form gets the C encoder.
+    """
+    if compact:
+        encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    else:
+        encoder = json.JSONEncoder(ensure_ascii=False, indent=2)
+    marker = "\ufffdcontentItems\ufffd"
+    head, tail = encoder.encode({**project, "contentItems": marker}).split(encoder.encode(marker), 1)
+    yield head
+    items = project["contentItems"]
+    if not items:
+        yield "[]"
+    elif compact:
+        yield "["
+        for n, item in enumerate(items):
+            yield ("," if n else "") + encoder.encode(item)
+        yield "]"
+    else:
+        # contentItems sits at depth 1, so its items are indented two levels
+        yield "[\n    "
+        for n, item in enumerate(items):
+            yield (",\n    " if n else "") + encoder.encode(item).replace("\n", "\n    ")
+        yield "\n  ]"
+    yield tail
+
+
+def _content_hash(*fields: str | None) -> str:
+    """MD5 hex of fields joined by "|", as sql/triggers.sql computes content_hash (None counts as "")."""
+    return hashlib.md5("|".join(field or "" for field in fields).encode("utf-8")).hexdigest()
+
+
+def fill_content_hashes(project: dict) -> None:
+    """
+    Set content_hash on the card and every content item the way the portal's
+    database triggers do (so an export of the imported card carries the same
+    values): md5(name|description) for the card and
+    md5(name|content|ai_knowledge_base) for an item.
+    """
+    for ci in project["contentItems"]:
+        ci["content_hash"] = _content_hash(ci["name"], ci["content"], ci["ai_knowledge_base"])
+    card = project["card"]
+    card["content_hash"] = _content_hash(card["name"], card["description"])
+
+
+# Image formats that are already compressed; deflating them again costs CPU for no gain
+STORED_IMAGE_EXTS = {"jpg", "jpeg", "jpx", "jp2", "png", "webp", "gif"}
+
+DEFAULT_ZIP_LEVEL = 6
+
+
+class ArchiveWriter:
+    """
+    Streaming ProjectArchive writer to a file path or a writable binary stream.
+    Images are written into the open ZIP as they arrive; project.json is written
+    last by finish(). If the block exits with an error a partial ZIP file is
+    removed (a caller's stream is left as it is).
+    Already-compressed images are stored as-is; project.json and any other
+    images are deflated at compress_level (0-9). compact_json drops the
+    indentation from project.json. finish() fills in the content hashes.
+    """
+
+    def __init__(
+        self, output_path: str | io.IOBase, profiler: Profiler = NULL_PROFILER,
+        compress_level: int = DEFAULT_ZIP_LEVEL, compact_json: bool = False,
+    ):
+        self.output_path = output_path
+        self.profiler = profiler
+        self.image_count = 0
+        self.image_bytes = 0
+        self.compact_json = compact_json
+        self._zf = zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED, compresslevel=compress_level)
+
+    def add_image(self, zip_path: str, data: bytes) -> None:
+        ext = os.path.splitext(zip_path)[1].lower().lstrip(".")
+        compress_type = zipfile.ZIP_STORED if ext in STORED_IMAGE_EXTS else None
+        with self.profiler.stage("zip_write_images"):
+            self._zf.writestr(zip_path, data, compress_type=compress_type)
+        self.image_count += 1
+        self.image_bytes += len(data)
+
+    def finish(self, project: dict) -> None:
+        fill_content_hashes(project)
+        with self.profiler.stage("zip_write_project"):
+            # Encoded straight into the entry so the whole JSON text is never held at once
+            with self._zf.open("project.json", "w") as raw, \
+                    io.TextIOWrapper(raw, encoding="utf-8") as f:
+                f.writelines(_project_json_chunks(project, self.compact_json))
+            self._zf.close()
+        self.profiler.count("images_written", self.image_count)
+        self.profiler.count("image_bytes_written", self.image_bytes)
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._zf.close()
+        if exc_type is not None and isinstance(self.output_path, str) and os.path.isfile(self.output_path):
+            os.remove(self.output_path)
+
+
+def create_zip(
+    project: dict, image_files: dict[str, bytes], output_path: str,
+    compress_level: int = DEFAULT_ZIP_LEVEL, compact_json: bool = False,
+) -> None:
+    """Package project.json and images into a ZIP archive (see ArchiveWriter)."""
+    with ArchiveWriter(output_path, compress_level=compress_level, compact_json=compact_json) as writer:
         for path, data in image_files.items():
-            zf.writestr(path, data)
+            writer.add_image(path, data)
+        writer.finish(project)
 
 
-# ── CLI ──────────────────────────────────────────────────────────────
+# ── Splitting archives ───────────────────────────────────────────────
+
+# Local header plus central directory record per ZIP entry, name excluded
+ZIP_ENTRY_OVERHEAD = 30 + 46
+
+
+def _category_groups(project: dict) -> list[list[dict]]:
+    """Content items per category: each category followed by its items, in order."""
+    groups: list[list[dict]] = []
+    for ci in project["contentItems"]:
+        if ci["parent_name"] is None or not groups:
+            groups.append([ci])
+        else:
+            groups[-1].append(ci)
+    return groups
+
+
+def _image_entries(names: list[str]) -> dict[str, list[str]]:
+    """Map each images/content/ path to it and its thumbnail, which share a file stem."""
+    by_stem: dict[str, list[str]] = {}
+    for name in names:
+        if name.startswith("images/"):
+            by_stem.setdefault(posixpath.splitext(posixpath.basename(name))[0], []).append(name)
+    return {
+        name: by_stem[stem]
+        for stem, entries in by_stem.items()
+        for name in entries if name.startswith("images/content/")
+    }
+
+
+def plan_archive_parts(
+    groups: list[list[dict]], group_bytes: list[int], base_bytes: int,
+    max_bytes: int | None = None, per_category: bool = False,
+) -> list[list[int]]:
+    """
+    Partition category groups (by index, keeping their order) into parts of
+    at most max_bytes, given each group's estimated size and the fixed size
+    of every part. per_category gives each category a part of its own. A
+    category that alone exceeds max_bytes still gets one part.
+    """
+    parts: list[list[int]] = []
+    size = 0
+    for idx, group_size in enumerate(group_bytes):
+        if not parts or per_category or (max_bytes and size + group_size > max_bytes):
+            parts.append([])
+            size = base_bytes
+        parts[-1].append(idx)
+        size += group_size
+    return parts
+
+
+def _part_project(project: dict, groups: list[list[dict]], part: int, parts: int) -> dict:
+    """The project.json of one part: its categories renumbered, the card named after the part."""
+    items = [dict(ci, content_hash=None) for group in groups for ci in group]
+    for n, ci in enumerate(items):
+        ci["sort_order"] = n
+    card = dict(project["card"], name=f"{project['card']['name']} (part {part} of {parts})", content_hash=None)
+    return {**project, "card": card, "contentItems": items}
+
+
+def _write_archive_part(
+    source_path: str, output_path: str, project: dict,
+    compress_level: int = DEFAULT_ZIP_LEVEL, compact_json: bool = False,
+) -> int:
+    """
+    Worker entry point: write one part archive with the images (and thumbnails)
+    its items reference, copied from the full archive. Returns its size.
+    """
+    with zipfile.ZipFile(source_path) as source:
+        entries = _image_entries(source.namelist())
+        with ArchiveWriter(output_path, compress_level=compress_level, compact_json=compact_json) as writer:
+            # Items may share an image file; copy each one once
+            names = dict.fromkeys(
+                name for ci in project["contentItems"] if ci["image"] for name in entries.get(ci["image"], [])
+            )
+            for name in names:
+                writer.add_image(name, source.read(name))
+            writer.finish(project)
+    return os.path.getsize(output_path)
+
+
+def split_archive(
+    archive_path: str, project: dict, max_bytes: int | None = None, per_category: bool = False,
+    workers: int = 1, compress_level: int = DEFAULT_ZIP_LEVEL, compact_json: bool = False,
+    profiler: Profiler = NULL_PROFILER,
+) -> list[tuple[str, int, int]]:
+    """
+    Split a finished archive into independent ProjectArchive ZIPs of whole
+    categories, at most max_bytes each (estimated from the compressed entry
+    sizes), or one per category. Each part is its own card with its own
+    project.json, images and content hashes, so parts import and retry
+    separately. Parts are written in parallel on up to workers processes as
+    {archive}-partN.zip and the full archive is removed; an archive that
+    fits in one part is left as it is.
+    Returns (path, size, categories) per archive.
+    """
+    groups = _category_groups(project)
+    with zipfile.ZipFile(archive_path) as zf:
+        infos = {info.filename: info for info in zf.infolist()}
+    entries = _image_entries(list(infos))
+
+    def entry_bytes(name: str) -> int:
+        return infos[name].compress_size + ZIP_ENTRY_OVERHEAD + 2 * len(name.encode())
+
+    # project.json shrinks by the full archive's ratio
+    json_info = infos["project.json"]
+    ratio = json_info.compress_size / max(1, json_info.file_size)
+    group_bytes = []
+    for group in groups:
+        size = sum(len(json.dumps(ci, ensure_ascii=False).encode()) for ci in group) * ratio
+        images = {ci["image"] for ci in group if ci["image"]}
+        size += sum(entry_bytes(name) for image in images for name in entries.get(image, []))
+        group_bytes.append(int(size))
+    header = json.dumps({**project, "contentItems": []}, ensure_ascii=False).encode()
+    base_bytes = int(len(header) * ratio) + entry_bytes("project.json") + 22
+
+    plan = plan_archive_parts(groups, group_bytes, base_bytes, max_bytes, per_category)
+    if len(plan) <= 1:
+        return [(archive_path, os.path.getsize(archive_path), len(groups))]
+
+    stem = os.path.splitext(archive_path)[0]
+    width = len(str(len(plan)))
+    paths = [f"{stem}-part{n:0{width}d}.zip" for n in range(1, len(plan) + 1)]
+    projects = [
+        _part_project(project, [groups[idx] for idx in part], n, len(plan))
+        for n, part in enumerate(plan, 1)
+    ]
+    job = functools.partial(_write_archive_part, compress_level=compress_level, compact_json=compact_json)
+    with profiler.stage("split_archive", memory=True):
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=min(workers, len(plan)), initializer=tracemalloc.stop) as pool:
+                sizes = list(pool.map(job, [archive_path] * len(plan), paths, projects))
+        else:
+            sizes = [job(archive_path, path, part) for path, part in zip(paths, projects)]
+    os.remove(archive_path)
+    profiler.count("archive_parts", len(plan))
+    return [(path, size, len(part)) for path, size, part in zip(paths, sizes, plan)]
+
+
+# ── Service mode ─────────────────────────────────────────────────────
+
+# Uploads larger than this are rejected before anything is written to disk
+SERVICE_MAX_UPLOAD = 1024 * 1024 * 1024
+SERVICE_LATENCY_WINDOW = 1000
+# Attempts per job when the worker pool breaks under it
+SERVICE_JOB_ATTEMPTS = 2
+
+
+def _service_worker_init() -> None:
+    """Pool initializer: import every installed extraction library once per worker process."""
+    for module in ("pymupdf", "docx", "olefile"):
+        with contextlib.suppress(ImportError):
+            importlib.import_module(module)
+
+
+def _service_pool_init() -> None:
+    """Service pool initializer: default SIGTERM handling, then _service_worker_init."""
+    # Forked workers inherit serve()'s SIGTERM handler, but a broken pool stops them with SIGTERM
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _log_to_stdout()  # spawned workers start without the CLI's logging setup
+    _service_worker_init()
+
+
+def _job_started_path(output_path: str) -> str:
+    """Marker a service worker creates when it starts on a job (next to its output)."""
+    return os.path.join(os.path.dirname(output_path), "started")
+
+
+def _service_job(input_path: str, output_path: str, args: argparse.Namespace, timeout: float = 0) -> float:
+    """
+    Service worker: convert one uploaded document; returns the conversion time.
+    With a timeout, SIGALRM's default action kills this worker when it runs
+    over, even inside a long MuPDF call; ConversionService replaces the pool.
+    """
+    start = time.perf_counter()
+    open(_job_started_path(output_path), "w").close()
+    if timeout and hasattr(signal, "setitimer"):
+        signal.signal(signal.SIGALRM, signal.SIG_DFL)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        convert_document(input_path, output_path, args)
+    finally:
+        if timeout and hasattr(signal, "setitimer"):
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return time.perf_counter() - start
+
+
+class ServiceMetrics:
+    """Thread-safe job counters and a window of recent latencies for GET /metrics."""
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.started = time.time()
+        self.in_flight = 0
+        self.counts = Counter()
+        self._latency: deque = deque(maxlen=SERVICE_LATENCY_WINDOW)
+        self._wait: deque = deque(maxlen=SERVICE_LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def job_started(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+            self.counts["submitted"] += 1
+
+    def job_finished(self, status: str, seconds: float, convert_seconds: float | None = None) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.counts[status] += 1
+            if convert_seconds is not None:
+                self._latency.append(seconds)
+                self._wait.append(max(0.0, seconds - convert_seconds))
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.counts[name] += 1
+
+    @staticmethod
+    def _summary(values) -> dict:
+        if not values:
+            return {"count": 0}
+        ordered = sorted(values)
+
+        def pct(p: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 4)
+
+        return {
+            "count": len(ordered),
+            "mean": round(sum(ordered) / len(ordered), 4),
+            "p50": pct(0.50),
+            "p95": pct(0.95),
+            "max": round(ordered[-1], 4),
+        }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "uptime_seconds": round(time.time() - self.started, 1),
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queue_depth": max(0, self.in_flight - self.workers),
+                "jobs": dict(self.counts),
+                "latency_seconds": self._summary(self._latency),
+                "queue_wait_seconds": self._summary(self._wait),
+            }
+
+
+class ConversionService:
+    """
+    Local conversion service: documents are POSTed to /convert, queued onto a
+    pool of worker processes that keep the extraction libraries imported, and
+    the archive ZIP is streamed back. At most workers + max_queue jobs are
+    accepted at once; further requests get 503 until a slot frees up.
+
+    A worker that dies (a crashing document, a job over job_timeout, or an
+    outside kill) breaks the whole pool. The pool is rebuilt and the jobs it
+    took down are retried, a queued one as often as needed and a running one
+    once, so only a document that crashes its worker twice fails. A job over
+    job_timeout fails without a retry.
+    """
+
+    def __init__(self, args: argparse.Namespace, workers: int, max_queue: int, job_timeout: float = 0):
+        # Jobs convert serially; parallelism is across requests
+        # Each request gets one archive back, so splitting is off
+        self.args = argparse.Namespace(**{
+            **vars(args), "workers": 1, "profile": False, "stats_json": None, "cprofile": None,
+            "max_archive_size": 0, "split_by_category": False,
+        })
+        self.workers = workers
+        self.job_timeout = job_timeout
+        self.metrics = ServiceMetrics(workers, max_queue)
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._pool_lock = threading.Lock()
+        # Import in the parent first so forked workers start warm
+        _service_worker_init()
+        self.pool = self._start_pool()
+
+    def _start_pool(self):
+        from concurrent.futures import ProcessPoolExecutor
+
+        pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_service_pool_init)
+        for future in [pool.submit(time.sleep, 0) for _ in range(self.workers)]:
+            future.result()
+        return pool
+
+    def _restart_pool(self, broken) -> None:
+        """Replace broken with a new pool, unless another thread already has."""
+        with self._pool_lock:
+            if self.pool is not broken:
+                return
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.pool = self._start_pool()
+            self.metrics.count("pool_restarts")
+        log.warning("Warning: a service worker died; worker pool restarted")
+
+    def healthy(self) -> bool:
+        """False if the worker pool is broken; it is restarted for the next check."""
+        from concurrent.futures.process import BrokenProcessPool
+
+        pool = self.pool
+        try:
+            pool.submit(int)
+        except BrokenProcessPool:
+            self._restart_pool(pool)
+            return False
+        except RuntimeError:  # Shut down by a concurrent restart
+            return False
+        return True
+
+    def job_args(self, query: dict[str, str], filename: str) -> argparse.Namespace:
+        """Per-request options from the query string over the service defaults. Raises ValueError."""
+        overrides = {"name": query.get("name") or os.path.splitext(filename)[0]}
+        if "language" in query:
+            overrides["language"] = query["language"]
+        if "mode" in query:
+            if query["mode"] not in CONTENT_MODES:
+                raise ValueError(f"invalid mode '{query['mode']}'")
+            overrides["mode"] = query["mode"]
+        if "grouped" in query:
+            overrides["grouped"] = True if query["grouped"].lower() in _ON_VALUES else None
+        if "pages" in query:
+            overrides["pages"] = parse_page_ranges(query["pages"])
+        return argparse.Namespace(**{**vars(self.args), **overrides})
+
+    def reserve(self) -> bool:
+        """Claim a queue slot for a job, or return False if the queue is full."""
+        if self._slots.acquire(blocking=False):
+            return True
+        self.metrics.count("rejected")
+        return False
+
+    def release(self) -> None:
+        self._slots.release()
+
+    def convert(self, input_path: str, output_path: str, args: argparse.Namespace) -> None:
+        """
+        Run one job on the pool and wait for it; records latency metrics.
+        Raises ConversionError if the job exceeds job_timeout or keeps
+        crashing its worker.
+        """
+        from concurrent.futures.process import BrokenProcessPool
+
+        start = time.perf_counter()
+        self.metrics.job_started()
+        status, convert_seconds = "failed", None
+        started_path = _job_started_path(output_path)
+        try:
+            attempts = 0
+            while convert_seconds is None:
+                pool = self.pool
+                try:
+                    convert_seconds = pool.submit(
+                        _service_job, input_path, output_path, args, self.job_timeout,
+                    ).result()
+                except BrokenProcessPool:
+                    self._restart_pool(pool)
+                    if not os.path.exists(started_path):
+                        continue  # Lost while queued
+                    ran = time.time() - os.path.getmtime(started_path)
+                    os.remove(started_path)
+                    if self.job_timeout and ran >= self.job_timeout:
+                        status = "timed_out"
+                        raise ConversionError(
+                            f"conversion exceeded the {self.job_timeout:g}s job time limit"
+                        ) from None
+                    attempts += 1
+                    if attempts >= SERVICE_JOB_ATTEMPTS:
+                        raise ConversionError("conversion crashed its worker process") from None
+                    self.metrics.count("retried")
+            status = "completed"
+        finally:
+            self.metrics.job_finished(status, time.perf_counter() - start, convert_seconds)
+
+    def close(self) -> None:
+        self.pool.shutdown(cancel_futures=True)
+
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    """HTTP front end of ConversionService (self.server.service)."""
+
+    server_version = "doc-to-archive"
+
+    def address_string(self) -> str:
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else "local"
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, indent=2).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        path = urlsplit(self.path).path
+        if path == "/healthz":
+            if self.server.service.healthy():
+                self._send_json(200, {"status": "ok"})
+            else:
+                self._send_json(503, {"status": "unhealthy", "error": "worker pool broken; restarting"})
+        elif path == "/metrics":
+            self._send_json(200, self.server.service.metrics.snapshot())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        """
+        POST /convert?filename=catalogue.pdf[&name=&language=&mode=&grouped=&pages=]
+        with the document as the request body; replies with the archive ZIP.
+        """
+        service = self.server.service
+        url = urlsplit(self.path)
+        if url.path != "/convert":
+            self._send_json(404, {"error": "not found"})
+            return
+        query = dict(parse_qsl(url.query))
+        filename = os.path.basename(query.get("filename") or self.headers.get("X-Filename") or "")
+        ext = os.path.splitext(filename)[1].lower()
+        if ext not in SUPPORTED_EXTENSIONS:
+            self._send_json(400, {"error": f"filename must end in one of {', '.join(sorted(SUPPORTED_EXTENSIONS))}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._send_json(400, {"error": "malformed Content-Length"})
+            return
+        if not 0 < length <= SERVICE_MAX_UPLOAD:
+            self._send_json(413 if length else 411, {"error": "Content-Length must be 1 byte to 1 GiB"})
+            return
+        try:
+            args = service.job_args(query, filename)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        if not service.reserve():
+            self._send_json(503, {"error": "queue full"})
+            return
+
+        work_dir = tempfile.mkdtemp(prefix="d2a_job_")
+        reserved = True
+        try:
+            input_path = os.path.join(work_dir, f"document{ext}")
+            output_path = os.path.join(work_dir, "archive.zip")
+            with open(input_path, "wb") as f:
+                remaining = length
+                while remaining:
+                    chunk = self.rfile.read(min(1 << 20, remaining))
+                    if not chunk:
+                        raise ConnectionError("upload ended early")
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            try:
+                service.convert(input_path, output_path, args)
+            except Exception as e:
+                message = str(e) or "conversion failed (see service log)"
+                self._send_json(422, {"error": message})
+                return
+            finally:
+                service.release()
+                reserved = False
+            self.send_response(200)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Content-Length", str(os.path.getsize(output_path)))
+            download = sanitize_filename(f"{args.name}_archive.zip")
+            self.send_header("Content-Disposition", f'attachment; filename="{download}"')
+            self.end_headers()
+            with open(output_path, "rb") as f:
+                shutil.copyfileobj(f, self.wfile, 1 << 20)
+        except ConnectionError:
+            pass  # Client went away
+        finally:
+            if reserved:
+                service.release()
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self) -> None:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.server_address)
+        super().server_bind()
+        # Only the owning user may talk to the service
+        os.chmod(self.server_address, 0o600)
+
+
+def serve(args: argparse.Namespace) -> None:
+    """
+    Run the conversion service until interrupted. args.serve is a port number
+    (HTTP on 127.0.0.1 only) or the path of a Unix socket to listen on.
+    """
+    workers = max(1, args.workers)
+    service = ConversionService(args, workers, args.max_queue, args.job_timeout)
+    if args.serve.isdigit():
+        httpd = ThreadingHTTPServer(("127.0.0.1", int(args.serve)), _ServiceHandler)
+        where = f"http://127.0.0.1:{httpd.server_address[1]}"
+    else:
+        httpd = _UnixHTTPServer(args.serve, _ServiceHandler)
+        where = f"unix:{args.serve}"
+    httpd.service = service
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    # Service managers stop daemons with SIGTERM
+    signal.signal(signal.SIGTERM, stop)
+    print(f"Serving on {where} with {workers} worker(s), queue {args.max_queue}")
+    print("  POST /convert?filename=NAME.pdf (document as body) -> archive ZIP")
+    print("  GET  /metrics, GET /healthz")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\nShutting down")
+    finally:
+        httpd.server_close()
+        service.close()
+        if not args.serve.isdigit():
+            with contextlib.suppress(OSError):
+                os.remove(args.serve)
+
+
+# ── Library API ──────────────────────────────────────────────────────
 
 SUPPORTED_EXTENSIONS = {".pdf", ".doc", ".docx"}
 
+CONTENT_MODES = ("single", "list", "grid", "cards")
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="Extract text + images from a PDF or Word document and generate a FunTell project archive ZIP."
-    )
-    parser.add_argument("input", help="Path to the input file (.pdf, .doc, or .docx)")
-    parser.add_argument("-o", "--output", help="Output ZIP path (default: {input}_archive.zip)")
-    parser.add_argument("-n", "--name", help="Project name (default: filename)")
-    parser.add_argument("-l", "--language", default="en", help="Original language code (default: en)")
-    parser.add_argument("-m", "--mode", default="list", choices=["single", "list", "grid", "cards"],
-                        help="Content mode (default: list)")
-    parser.add_argument("-g", "--grouped", default=None, action="store_true",
-                        help="Enable grouped categories (default: auto-detect)")
+# Options that only make sense on the command line
+_CLI_ONLY_OPTIONS = {
+    "input", "output", "serve", "max_queue", "job_timeout", "profile", "stats_json", "cprofile",
+    "max_archive_size", "split_by_category",
+}
 
-    args = parser.parse_args()
 
-    if not os.path.isfile(args.input):
-        print(f"Error: File not found: {args.input}")
-        sys.exit(1)
+def page_budget(args: argparse.Namespace) -> PageBudget | None:
+    """The PageBudget set by --page-timeout / --page-memory, or None."""
+    if not (args.page_timeout or args.page_memory):
+        return None
+    if args.page_memory and _current_vm_bytes() is None:
+        log.info("Note: --page-memory is only enforced on Linux; pages have a time budget only")
+    return PageBudget(args.page_timeout, args.page_memory * 1024 * 1024)
 
-    ext = os.path.splitext(args.input)[1].lower()
-    if ext not in SUPPORTED_EXTENSIONS:
-        print(f"Error: Unsupported file type '{ext}'. Supported: {', '.join(SUPPORTED_EXTENSIONS)}")
-        sys.exit(1)
 
-    if not args.output:
-        base = os.path.splitext(args.input)[0]
-        args.output = f"{base}_archive.zip"
+def write_archive(
+    source: str | bytes, kind: str, output: str | io.IOBase, args: argparse.Namespace,
+    name_path: str, profiler: Profiler = NULL_PROFILER, in_memory: bool = False,
+    budget: PageBudget | None = None,
+) -> tuple[dict, list[str], "ImageNormalizer | None"]:
+    """
+    Extract source (a path or the document bytes; kind is "pdf", "docx" or
+    "doc") and write its ProjectArchive to output, a path or a writable binary
+    stream. name_path gives the default project name. in_memory keeps the page
+    spool off disk; budget limits each PDF page and collects degraded pages.
+    Returns (project, image_paths, normalizer).
+    Raises UnsupportedDocError before anything is written if the built-in .doc
+    reader cannot handle the file.
+    """
+    cache = None
+    if not args.no_cache:
+        cache = ExtractionCache(args.cache_dir, args.cache_size * 1024 * 1024)
+
+    page_ranges = args.pages
+    if page_ranges and kind != "pdf":
+        log.info(f"Note: --pages only applies to PDF files; converting all of {name_path}")
+        page_ranges = None
+    # A sampled threshold lets pages stream straight into the structure pass
+    fast_text = kind == "pdf" and args.fast_text and _fast_text_supported()
+    threshold = None
+    if kind == "pdf" and args.sample_pages:
+        threshold = sample_pdf_heading_threshold(
+            source, args.sample_pages, page_ranges, cache.cache_dir if cache else None, profiler, budget,
+            fast_text,
+        )
+
+    # Extract into a page spool (format dispatch happens in extract_document)
+    with profiler.stage(f"process_{kind}", memory=True):
+        spool = extract_document(
+            source, args.workers, cache, profiler, page_ranges, threshold, kind=kind, in_memory=in_memory,
+            budget=budget, fast_text=fast_text,
+        )
+
+    # Replay pages into the structure, streaming images into the archive as they are placed
+    normalizer = None
+    with contextlib.ExitStack() as stack:
+        stack.enter_context(spool)
+        sink = stack.enter_context(ArchiveWriter(
+            output, profiler, compress_level=args.zip_level, compact_json=args.compact_json,
+        ))
+        if args.normalize_images:
+            normalizer = sink = stack.enter_context(ImageNormalizer(
+                sink, max_dim=args.max_dimension, fmt=args.image_format,
+                quality=args.image_quality, thumb_dim=args.thumbnail_size,
+                workers=args.workers,
+            ))
+        builder = StructureBuilder(args, spool.heading_threshold(), sink.add_image)
+        with profiler.stage("build_structure", memory=True):
+            for blocks, images, frontier in spool:
+                builder.add_page(blocks, images, frontier)
+            project, image_paths = builder.finish(name_path)
+        profiler.count("text_blocks", builder.block_count)
+        profiler.count("images_found", builder.image_count)
+        with profiler.stage("finish_archive", memory=True):
+            sink.finish(project)
+    if cache:
+        cache.prune()
+    return project, image_paths, normalizer
+
+
+def _doc_to_docx_bytes(source: str | bytes) -> bytes:
+    """Convert a .doc path or bytes to .docx bytes with LibreOffice (the one step needing temp files)."""
+    with tempfile.TemporaryDirectory(prefix="d2a_doc_") as work_dir:
+        doc_path = source
+        if not isinstance(source, str):
+            doc_path = os.path.join(work_dir, "document.doc")
+            with open(doc_path, "wb") as f:
+                f.write(source)
+        docx_path = convert_doc_to_docx(doc_path)
+        try:
+            with open(docx_path, "rb") as f:
+                return f.read()
+        finally:
+            shutil.rmtree(os.path.dirname(docx_path), ignore_errors=True)
 
-    print(f"Processing: {args.input} ({ext})")
 
-    # Handle .doc conversion
-    temp_docx = None
-    processing_file = args.input
+def convert(source, filename: str | None = None, output=None, **options) -> bytes | None:
+    """
+    Convert a document into a ProjectArchive ZIP in memory.
+    source is the document as bytes, a readable binary file object or a path;
+    filename (e.g. "catalogue.pdf") picks the format by its extension and
+    gives the default project name, and is required unless source is a path.
+    The ZIP is written to output, a writable binary stream, or returned as
+    bytes when there is none. options are the command-line options by their
+    argparse names (name, language, mode, grouped, workers, normalize_images,
+    zip_level, compact_json, pages, sample_pages, libreoffice, ...); pages
+    takes "10-120,300-" or parse_page_ranges() output. The extraction cache
+    is off unless no_cache=False is passed. Pages are spooled in memory, so
+    nothing touches the disk except a .doc that needs LibreOffice. With
+    page_timeout / page_memory, PDF pages over budget are degraded (see
+    PageBudget). Notes and warnings go to the "doc_to_archive" logger;
+    nothing is printed.
+    Raises ConversionError if the document cannot be converted, and
+    ValueError or TypeError for bad arguments.
+
+        archive = convert(pdf_bytes, "catalogue.pdf", mode="cards", pages="1-40")
+    """
+    args = build_parser().parse_args([])
+    args.no_cache = True
+    for key, value in options.items():
+        if key in _CLI_ONLY_OPTIONS or not hasattr(args, key):
+            raise TypeError(f"convert() got an unexpected option '{key}'")
+        setattr(args, key, value)
+    if args.mode not in CONTENT_MODES:
+        raise ValueError(f"mode must be one of {', '.join(CONTENT_MODES)}, not {args.mode!r}")
+    if isinstance(args.pages, str):
+        args.pages = parse_page_ranges(args.pages)
+
+    if hasattr(source, "read"):
+        source = source.read()
+    if isinstance(source, str):
+        filename = filename or source
+    elif not isinstance(source, bytes):
+        source = bytes(source)
+    if not filename:
+        raise ValueError("filename is required when source is not a path")
+    kind = os.path.splitext(filename)[1].lower().lstrip(".")
+    if f".{kind}" not in SUPPORTED_EXTENSIONS:
+        raise ValueError(f"unsupported file type '{filename}' (expected .pdf, .doc or .docx)")
+
+    budget = page_budget(args) if kind == "pdf" else None
+    sink = io.BytesIO() if output is None else output
+    if kind == "doc" and not args.libreoffice:
+        try:
+            write_archive(source, kind, sink, args, filename, in_memory=True)
+            return sink.getvalue() if output is None else None
+        except UnsupportedDocError as e:
+            # Raised before anything is written to sink
+            log.warning(f"Built-in .doc reader cannot handle this file ({e}); falling back to LibreOffice")
+    if kind == "doc":
+        source, kind = _doc_to_docx_bytes(source), "docx"
+    write_archive(source, kind, sink, args, filename, in_memory=True, budget=budget)
+    return sink.getvalue() if output is None else None
 
-    if ext == ".doc":
-        temp_docx = convert_doc_to_docx(args.input)
-        processing_file = temp_docx
-        ext = ".docx"
 
+# ── CLI ──────────────────────────────────────────────────────────────
+
+def _log_to_stdout() -> None:
+    """Print the library's log messages as plain lines, as the CLI output always has."""
+    if log.level != logging.NOTSET:
+        return  # already set up (inherited by a forked worker)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+
+
+def convert_file(
+    input_path: str, output_path: str, args: argparse.Namespace, source_path: str | None = None,
+    profiler: Profiler = NULL_PROFILER,
+) -> dict:
+    """
+    Convert one document into a ProjectArchive ZIP and print a summary.
+    source_path is the file actually parsed when it differs from input_path
+    (a .docx converted from .doc). A .doc source is read with the built-in
+    reader, which raises UnsupportedDocError before anything is written if it
+    cannot handle the file. With --max-archive-size / --split-by-category the
+    archive is then split into parts (see split_archive). Returns the project
+    dict of the whole document.
+    """
+    source_path = source_path or input_path
+    kind = os.path.splitext(source_path)[1].lower().lstrip(".")
+    budget = page_budget(args) if kind == "pdf" else None
+    project, image_paths, normalizer = write_archive(
+        source_path, kind, output_path, args, input_path, profiler, budget=budget,
+    )
+    profiler.count("content_items", len(project["contentItems"]))
+    profiler.count("archive_bytes", os.path.getsize(output_path))
+    max_bytes = int(args.max_archive_size * 1024 * 1024) or None
+    parts = []
+    if max_bytes or args.split_by_category:
+        parts = split_archive(
+            output_path, project, max_bytes, args.split_by_category, args.workers,
+            args.zip_level, args.compact_json, profiler,
+        )
+
+    # Summary
+    items = [ci for ci in project["contentItems"] if ci["parent_name"] is not None]
+    cats = [ci for ci in project["contentItems"] if ci["parent_name"] is None]
+    images_with = sum(1 for ci in items if ci.get("image"))
+
+    if len(parts) > 1:
+        print(f"\nArchives created: {len(parts)} parts")
+        for path, size, categories in parts:
+            over = " (over --max-archive-size)" if max_bytes and size > max_bytes else ""
+            print(f"  {path}: {format_bytes(size)}, categories: {categories}{over}")
+    else:
+        print(f"\nArchive created: {output_path}")
+    print(f"  Categories: {len(cats)}")
+    print(f"  Content items: {len(items)}")
+    print(f"  Images: {len(image_paths)} extracted, {images_with} associated with items")
+    if normalizer:
+        saved = normalizer.bytes_in - normalizer.bytes_out
+        print(f"  Normalized: {normalizer.image_count} images, "
+              f"{format_bytes(normalizer.bytes_in)} -> {format_bytes(normalizer.bytes_out)} "
+              f"(saved {format_bytes(saved)})")
+    print(f"  Content mode: {args.mode}, Grouped: {project['card']['is_grouped']}")
+    if budget and budget.degraded:
+        print(f"  Degraded pages: {len(budget.degraded)}")
+        for entry in budget.report():
+            print(f"    page {entry.page}: {entry.reason} -> {entry.outcome}")
+    return project
+
+
+def convert_document(
+    input_path: str, output_path: str, args: argparse.Namespace, profiler: Profiler = NULL_PROFILER,
+) -> dict:
+    """
+    Convert one input file with convert_file(). A .doc is read natively and
+    only goes through a temporary LibreOffice .docx when the built-in reader
+    cannot handle it (or always, with args.libreoffice). Returns the project dict.
+    """
+    ext = os.path.splitext(input_path)[1].lower()
+    temp_docx = None
     try:
-        # Dispatch to format-specific processor
-        if ext == ".pdf":
-            all_blocks, all_images, _ = process_pdf(processing_file)
-        else:  # .docx
-            all_blocks, all_images, _ = process_docx(processing_file)
-
-        # Build structure and create archive
-        project, image_files = build_structure(all_blocks, all_images, args, args.input)
-        create_zip(project, image_files, args.output)
-
-        # Summary
-        items = [ci for ci in project["contentItems"] if ci["parent_name"] is not None]
-        cats = [ci for ci in project["contentItems"] if ci["parent_name"] is None]
-        images_with = sum(1 for ci in items if ci.get("image"))
-
-        print(f"\nArchive created: {args.output}")
-        print(f"  Categories: {len(cats)}")
-        print(f"  Content items: {len(items)}")
-        print(f"  Images: {len(image_files)} extracted, {images_with} associated with items")
-        print(f"  Content mode: {args.mode}, Grouped: {project['card']['is_grouped']}")
-        print(f"\nImport this ZIP via the FunTell web portal: Dashboard > Import")
+        # Read .doc natively; LibreOffice only for files the built-in reader can't handle
+        use_libreoffice = ext == ".doc" and args.libreoffice
+        if ext == ".doc" and not use_libreoffice:
+            try:
+                return convert_file(input_path, output_path, args, None, profiler)
+            except UnsupportedDocError as e:
+                log.warning(f"Built-in .doc reader cannot handle this file ({e}); falling back to LibreOffice")
+
+        if ext == ".doc":
+            with profiler.stage("libreoffice"):
+                temp_docx = convert_doc_to_docx(input_path)
+        return convert_file(input_path, output_path, args, temp_docx, profiler)
 
     finally:
         # Clean up temporary .docx file if we converted from .doc
@@ -545,5 +3485,301 @@ def main():
                 pass  # Best effort cleanup
 
 
+def _collect_inputs(paths: list[str]) -> list[str]:
+    """Expand directories to the supported files they contain and validate every input."""
+    inputs = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = sorted(
+                os.path.join(path, name) for name in os.listdir(path)
+                if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS
+                and not name.startswith("~$")  # Word lock files
+                and os.path.isfile(os.path.join(path, name))
+            )
+            if not found:
+                print(f"Warning: No supported files in directory: {path}")
+            inputs.extend(found)
+            continue
+        if not os.path.isfile(path):
+            print(f"Error: File not found: {path}")
+            sys.exit(1)
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in SUPPORTED_EXTENSIONS:
+            print(f"Error: Unsupported file type '{ext}'. Supported: {', '.join(SUPPORTED_EXTENSIONS)}")
+            sys.exit(1)
+        inputs.append(path)
+    if not inputs:
+        print("Error: No input files to process.")
+        sys.exit(1)
+    return inputs
+
+
+@contextlib.contextmanager
+def profiling(input_path: str, stats_path: str | None = None, cprofile_path: str | None = None,
+              echo: bool = False):
+    """
+    Yield a Profiler for one conversion with tracemalloc running. On success the
+    JSON report is written to stats_path and/or printed (echo), and cProfile
+    stats are dumped to cprofile_path.
+    """
+    profiler = Profiler()
+    cprof = cProfile.Profile() if cprofile_path else None
+    tracemalloc.start()
+    start = time.perf_counter()
+    if cprof:
+        cprof.enable()
+    try:
+        yield profiler
+    finally:
+        if cprof:
+            cprof.disable()
+            cprof.dump_stats(cprofile_path)
+        # Stages reset the tracemalloc peak, so the overall peak is the largest seen
+        peak = max([tracemalloc.get_traced_memory()[1], *profiler.memory_peaks.values()])
+        tracemalloc.stop()
+
+    report = {
+        "input": input_path,
+        "total_seconds": round(time.perf_counter() - start, 6),
+        "memory_peak_bytes_total": peak,
+        **profiler.report(),
+    }
+    if stats_path:
+        with open(stats_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Profile written: {stats_path}")
+    if echo:
+        print("\nProfile:")
+        print(json.dumps(report, indent=2))
+    if cprofile_path:
+        print(f"cProfile stats written: {cprofile_path} (view with: python -m pstats {cprofile_path})")
+
+
+def _wants_profile(args: argparse.Namespace) -> bool:
+    return bool(args.profile or args.stats_json or args.cprofile)
+
+
+def _preload_processor(path: str) -> None:
+    """Import the extraction library up front; importing it under tracemalloc takes seconds."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".pdf":
+        _check_pymupdf()
+    else:
+        if ext == ".doc":
+            _check_olefile()
+        _check_docx()
+
+
+def _convert_batch_job(path: str, output: str, args: argparse.Namespace, source_path: str | None) -> dict:
+    """Batch worker: convert one file, writing profile reports next to its archive."""
+    if not _wants_profile(args):
+        return convert_file(path, output, args, source_path)
+    base = os.path.splitext(output)[0]
+    stats_path = f"{base}.stats.json" if args.profile or args.stats_json else None
+    cprofile_path = f"{base}.prof" if args.cprofile else None
+    _preload_processor(path)
+    with profiling(path, stats_path, cprofile_path) as profiler:
+        return convert_file(path, output, args, source_path, profiler)
+
+
+def run_batch(inputs: list[str], args: argparse.Namespace) -> None:
+    """
+    Convert many documents concurrently with a pool of args.workers processes.
+    .doc files are read natively in the pool; those the built-in reader cannot
+    handle (or all of them with --libreoffice) are then converted through a few
+    shared LibreOffice runs and queued again.
+    Archives go to args.output (a directory) or next to each input, along with
+    per-file .stats.json / .prof reports when profiling. Exits with status 1 if
+    any file failed.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    workers = max(1, args.workers)
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+    if args.name:
+        print("Warning: --name is ignored when converting multiple files")
+    # Parallelism is across files; each file is processed serially
+    job_args = argparse.Namespace(**{**vars(args), "name": None, "workers": 1})
+
+    outputs: dict[str, str] = {}
+    used_outputs: set[str] = set()
+    for path in inputs:
+        base = os.path.splitext(os.path.basename(path))[0]
+        out_dir = args.output or os.path.dirname(path)
+        output = os.path.join(out_dir, f"{base}_archive.zip")
+        n = 2
+        while output in used_outputs:
+            output = os.path.join(out_dir, f"{base}-{n}_archive.zip")
+            n += 1
+        used_outputs.add(output)
+        outputs[path] = output
+
+    def is_doc(path: str) -> bool:
+        return os.path.splitext(path)[1].lower() == ".doc"
+
+    failures: list[tuple[str, str]] = []
+    fallback_docs = [p for p in inputs if is_doc(p)] if args.libreoffice else []
+    temp_dir = None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            def run_jobs(jobs: list[tuple[str, str | None]]) -> None:
+                futures = {
+                    pool.submit(_convert_batch_job, path, outputs[path], job_args, source): path
+                    for path, source in jobs
+                }
+                for future in as_completed(futures):
+                    path = futures[future]
+                    try:
+                        future.result()
+                    except UnsupportedDocError as e:
+                        print(f"Built-in .doc reader cannot handle {path} ({e}); using LibreOffice")
+                        fallback_docs.append(path)
+                    except Exception as e:
+                        failures.append((path, str(e) or type(e).__name__))
+
+            run_jobs([(p, None) for p in inputs if not (args.libreoffice and is_doc(p))])
+
+            if fallback_docs:
+                converted, temp_dir = convert_docs_to_docx(fallback_docs, workers)
+                for path in fallback_docs:
+                    if path not in converted:
+                        failures.append((path, "LibreOffice conversion failed"))
+                run_jobs([(p, converted[p]) for p in fallback_docs if p in converted])
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    print(f"\nBatch complete: {len(inputs) - len(failures)} converted, {len(failures)} failed")
+    for path, reason in failures:
+        print(f"  ✗ {path}: {reason}")
+    if failures:
+        sys.exit(1)
+    print(f"\nImport these ZIPs via the FunTell web portal: Dashboard > Import")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """The command-line parser; its defaults are also convert()'s option defaults."""
+    parser = argparse.ArgumentParser(
+        description="Extract text + images from PDF or Word documents and generate FunTell project archive ZIPs."
+    )
+    parser.add_argument("input", nargs="*",
+                        help="Input file(s) (.pdf, .doc, or .docx) or directories containing them")
+    parser.add_argument("-o", "--output",
+                        help="Output ZIP path (default: {input}_archive.zip); "
+                             "an output directory when converting multiple files")
+    parser.add_argument("-n", "--name", help="Project name (default: filename; single input only)")
+    parser.add_argument("-l", "--language", default="en", help="Original language code (default: en)")
+    parser.add_argument("-m", "--mode", default="list", choices=CONTENT_MODES,
+                        help="Content mode (default: list)")
+    parser.add_argument("-g", "--grouped", default=None, action="store_true",
+                        help="Enable grouped categories (default: auto-detect)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Worker processes for PDF extraction and image normalization, "
+                             "or for files and LibreOffice instances in batch mode (default: 1)")
+    parser.add_argument("--normalize-images", action="store_true",
+                        help="Downscale and re-encode images before archiving (requires Pillow)")
+    parser.add_argument("--max-dimension", type=int, default=2048,
+                        help="Longest image side in px when normalizing (default: 2048)")
+    parser.add_argument("--image-format", default="webp", choices=["webp", "jpeg"],
+                        help="Re-encode format when normalizing (default: webp)")
+    parser.add_argument("--image-quality", type=int, default=85,
+                        help="Encoder quality 1-100 when normalizing (default: 85)")
+    parser.add_argument("--thumbnail-size", type=int, default=0,
+                        help="Also write thumbnails of this max size in px when normalizing (default: off)")
+    parser.add_argument("--zip-level", type=int, default=DEFAULT_ZIP_LEVEL, choices=range(10), metavar="0-9",
+                        help=f"Deflate level for project.json and uncompressed images; JPEG/PNG/WebP/GIF "
+                             f"are always stored as-is (default: {DEFAULT_ZIP_LEVEL})")
+    parser.add_argument("--compact-json", action="store_true",
+                        help="Write project.json without indentation")
+    parser.add_argument("--max-archive-size", type=float, default=0, metavar="MB",
+                        help="Split the output into independent archives of whole categories, "
+                             "each at most MB megabytes, written in parallel with -w (default: off)")
+    parser.add_argument("--split-by-category", action="store_true",
+                        help="Write one independent archive per category")
+    parser.add_argument("--pages", metavar="RANGES",
+                        help="Only convert these PDF pages, e.g. 10-120,300- (1-based, inclusive)")
+    parser.add_argument("--sample-pages", type=int, default=0, metavar="N",
+                        help="Detect PDF headings from N randomly sampled pages instead of "
+                             "all of them, streaming pages without a first pass (default: off)")
+    parser.add_argument("--page-timeout", type=float, default=0, metavar="SECONDS",
+                        help="Extract each PDF page in an isolated worker and give up on it after "
+                             "SECONDS; it is retried text-only, then skipped (default: off)")
+    parser.add_argument("--page-memory", type=int, default=0, metavar="MB",
+                        help="Likewise limit the memory extracting one PDF page may allocate "
+                             "(Linux only; default: off)")
+    parser.add_argument("--fast-text", action="store_true",
+                        help="Read PDF font size and bold from the ends of each line instead of "
+                             "every span; much faster on pages with many small spans")
+    parser.add_argument("--libreoffice", action="store_true",
+                        help="Convert .doc files with LibreOffice instead of the built-in reader")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not read or write the extraction cache")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"Extraction cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-size", type=int, default=512,
+                        help="Extraction cache size limit in MB (default: 512)")
+    parser.add_argument("--serve", metavar="PORT|SOCKET",
+                        help="Run as a conversion service on 127.0.0.1:PORT or a Unix socket path "
+                             "instead of converting input files (-w sets the worker pool size)")
+    parser.add_argument("--max-queue", type=int, default=16,
+                        help="Jobs the service queues beyond its busy workers before answering 503 "
+                             "(default: 16)")
+    parser.add_argument("--job-timeout", type=float, default=600, metavar="SECONDS",
+                        help="Kill a service job's worker after SECONDS and fail the job; 0 disables "
+                             "(default: 600)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print a JSON report of per-stage/per-page timings, image stats and memory peaks")
+    parser.add_argument("--stats-json", metavar="PATH",
+                        help="Write the --profile report to PATH instead of printing it")
+    parser.add_argument("--cprofile", metavar="PATH",
+                        help="Also dump cProfile stats to PATH")
+    return parser
+
+
+def main():
+    _log_to_stdout()
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.pages:
+        try:
+            args.pages = parse_page_ranges(args.pages)
+        except ValueError as e:
+            print(f"Error: --pages: {e}")
+            sys.exit(1)
+
+    if args.serve:
+        serve(args)
+        return
+    if not args.input:
+        parser.error("the following arguments are required: input (or use --serve)")
+
+    inputs = _collect_inputs(args.input)
+    if len(inputs) > 1 or any(os.path.isdir(p) for p in args.input):
+        run_batch(inputs, args)
+        return
+
+    input_path = inputs[0]
+    ext = os.path.splitext(input_path)[1].lower()
+    output_path = args.output or f"{os.path.splitext(input_path)[0]}_archive.zip"
+
+    print(f"Processing: {input_path} ({ext})")
+
+    profile_ctx = contextlib.nullcontext(NULL_PROFILER)
+    if _wants_profile(args):
+        _preload_processor(input_path)
+        profile_ctx = profiling(input_path, args.stats_json, args.cprofile,
+                                echo=args.profile and not args.stats_json)
+
+    with profile_ctx as profiler:
+        convert_document(input_path, output_path, args, profiler)
+    print(f"\nImport this ZIP via the FunTell web portal: Dashboard > Import")
+
+
 if __name__ == "__main__":
-    main()
+    # Conversion code raises; only the command line turns errors into an exit status
+    try:
+        main()
+    except ConversionError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
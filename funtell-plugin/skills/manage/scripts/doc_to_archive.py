@@ -0,0 +1,20 @@
+"""
+Importable name for doc-to-archive.py, whose file name is not a valid module name.
+
+    from doc_to_archive import convert
+    archive = convert(pdf_bytes, "catalogue.pdf", mode="cards")
+
+The script module replaces this one in sys.modules, so worker processes
+unpickle its functions by the same name.
+"""
+
+import importlib.util
+import os
+import sys
+
+_spec = importlib.util.spec_from_file_location(
+    __name__, os.path.join(os.path.dirname(os.path.abspath(__file__)), "doc-to-archive.py"),
+)
+_module = importlib.util.module_from_spec(_spec)
+sys.modules[__name__] = _module
+_spec.loader.exec_module(_module)
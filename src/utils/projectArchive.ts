@@ -137,14 +137,57 @@ async function fetchImageAsFile(url: string, filename: string, maxRetries = 3):
 }
 
 /**
- * Calculate content hash for integrity verification
+ * Calculate content hash for integrity verification: the MD5 hex of the
+ * fields joined by "|", as the database triggers compute content_hash
+ * (md5(name|description) for cards, md5(name|content|ai_knowledge_base) for items)
  */
-async function calculateContentHash(content: string): Promise<string> {
-  const encoder = new TextEncoder()
-  const data = encoder.encode(content)
-  const hashBuffer = await crypto.subtle.digest('SHA-256', data)
-  const hashArray = Array.from(new Uint8Array(hashBuffer))
-  return hashArray.map(b => b.toString(16).padStart(2, '0')).join('')
+async function calculateContentHash(...fields: string[]): Promise<string> {
+  return md5Hex(new TextEncoder().encode(fields.join('|')))
+}
+
+// Per-round shift amounts and sine-derived constants of MD5 (RFC 1321)
+const MD5_SHIFTS = [7, 12, 17, 22, 5, 9, 14, 20, 4, 11, 16, 23, 6, 10, 15, 21]
+const MD5_K = Array.from({ length: 64 }, (_, i) => Math.floor(Math.abs(Math.sin(i + 1)) * 2 ** 32) >>> 0)
+
+/**
+ * MD5 hex digest of bytes (Web Crypto has no MD5, and Postgres' md5() is what the triggers use)
+ */
+function md5Hex(bytes: Uint8Array): string {
+  // Pad to a multiple of 64 bytes: 0x80, zeros, then the bit length (little-endian)
+  const padded = new Uint8Array(((bytes.length + 8) >> 6) * 64 + 64)
+  padded.set(bytes)
+  padded[bytes.length] = 0x80
+  const view = new DataView(padded.buffer)
+  view.setUint32(padded.length - 8, (bytes.length * 8) >>> 0, true)
+  view.setUint32(padded.length - 4, Math.floor(bytes.length / 0x20000000), true)
+
+  let a0 = 0x67452301, b0 = 0xefcdab89, c0 = 0x98badcfe, d0 = 0x10325476
+  const m = new Array<number>(16)
+  for (let offset = 0; offset < padded.length; offset += 64) {
+    for (let j = 0; j < 16; j++) m[j] = view.getUint32(offset + j * 4, true)
+    let a = a0, b = b0, c = c0, d = d0
+    for (let i = 0; i < 64; i++) {
+      let f: number, g: number
+      if (i < 16) { f = (b & c) | (~b & d); g = i }
+      else if (i < 32) { f = (d & b) | (~d & c); g = (5 * i + 1) % 16 }
+      else if (i < 48) { f = b ^ c ^ d; g = (3 * i + 5) % 16 }
+      else { f = c ^ (b | ~d); g = (7 * i) % 16 }
+      const sum = (a + f + MD5_K[i] + m[g]) | 0
+      const shift = MD5_SHIFTS[(i >> 4) * 4 + (i % 4)]
+      a = d
+      d = c
+      c = b
+      b = (b + ((sum << shift) | (sum >>> (32 - shift)))) | 0
+    }
+    a0 = (a0 + a) | 0
+    b0 = (b0 + b) | 0
+    c0 = (c0 + c) | 0
+    d0 = (d0 + d) | 0
+  }
+
+  const out = new DataView(new ArrayBuffer(16))
+  ;[a0, b0, c0, d0].forEach((word, i) => out.setUint32(i * 4, word, true))
+  return Array.from(new Uint8Array(out.buffer)).map(b => b.toString(16).padStart(2, '0')).join('')
 }
 
 /**
@@ -470,9 +513,9 @@ export async function importProject(files: File | File[]): Promise<ImportResult>
         }
 
         // Validate content hash if present
-        if (item.content_hash && item.content) {
+        if (item.content_hash) {
           try {
-            const calculatedHash = await calculateContentHash(item.content)
+            const calculatedHash = await calculateContentHash(item.name, item.content, item.ai_knowledge_base)
             if (calculatedHash !== item.content_hash) {
               result.warnings.push(`${file.name}: Content hash mismatch for "${item.name}" - data may have been modified`)
             }
@@ -482,15 +525,15 @@ export async function importProject(files: File | File[]): Promise<ImportResult>
         }
       }
 
-      // Validate card description hash if present
-      if (card.content_hash && card.description) {
+      // Validate card hash if present
+      if (card.content_hash) {
         try {
-          const calculatedHash = await calculateContentHash(card.description)
+          const calculatedHash = await calculateContentHash(card.name, card.description)
           if (calculatedHash !== card.content_hash) {
-            result.warnings.push(`${file.name}: Card description hash mismatch - data may have been modified`)
+            result.warnings.push(`${file.name}: Card content hash mismatch - data may have been modified`)
           }
         } catch (err) {
-          result.warnings.push(`${file.name}: Failed to validate card description hash`)
+          result.warnings.push(`${file.name}: Failed to validate card content hash`)
         }
       }
 